@@ -0,0 +1,160 @@
+"""Benchmarks of the coordinator and platforms with a synthetic device fleet.
+
+Each benchmark runs for fleets of 10 to 10,000 devices, 50 per hub, fed
+through a real HomismartSession so the client library's parsing is
+included. Compare runs with ``--benchmark-json`` and
+``pytest-benchmark compare``.
+"""
+import asyncio
+import tracemalloc
+
+import pytest
+from homismart_client.enums import ReceivePrefix
+
+import test_integration as stubs
+from homismart_server import make_fleet
+
+FLEET_SIZES = [10, 100, 1000, 10000]
+
+
+async def _settle(coordinator):
+    """Yield to the loop until queued pushes and entity updates are done."""
+    while (
+        coordinator._ingest_handle is not None
+        or coordinator._flush_handle is not None
+    ):
+        await asyncio.sleep(0)
+
+
+def build_fleet(loop, fleet):
+    """Discover *fleet* and attach push-subscribed entities to it."""
+    coordinator, hass, entry = stubs._make_coordinator()
+    session = stubs._attach_real_session(coordinator)
+    coordinator._async_register_listeners()
+    adders = loop.run_until_complete(
+        stubs._setup_platforms(coordinator, hass, entry)
+    )
+    session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, fleet)
+    coordinator._new_device_handle.cancel()
+    coordinator._async_flush_new_devices()
+
+    entities = [
+        entity
+        for adder in adders.values()
+        for call in adder.call_args_list
+        for entity in call.args[0]
+    ]
+    for entity in entities:
+        entity.hass = hass
+        entity.entity_id = f"homismart.{entity.device.id}"
+        entity.async_write_ha_state = lambda: None
+        entity._last_written_state = entity._projected_state()
+        coordinator.async_subscribe_device(entity.device.id, entity._update_callback)
+    return coordinator, session, entities
+
+
+def _rounds(size):
+    return 2 if size >= 10000 else 5
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES)
+def test_setup(benchmark, loop, fleet_cleanup, size):
+    """Discovery of the whole fleet up to entities being added."""
+    fleet = make_fleet(size)
+
+    def _setup():
+        coordinator, _, entities = build_fleet(loop, fleet)
+        fleet_cleanup.append(coordinator)
+        return entities
+
+    entities = benchmark.pedantic(_setup, rounds=_rounds(size), iterations=1)
+    assert len(entities) == size
+    benchmark.extra_info["devices"] = size
+    # benchmark.stats is None with --benchmark-disable.
+    if benchmark.stats:
+        benchmark.extra_info["us_per_device"] = round(
+            benchmark.stats.stats.median / size * 1e6, 2
+        )
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES)
+def test_device_updated_throughput(benchmark, loop, fleet_cleanup, size):
+    """One state-changing push per device, through to the entity writes."""
+    coordinator, session, _ = build_fleet(loop, make_fleet(size))
+    fleet_cleanup.append(coordinator)
+    ids = list(coordinator._device_hub)
+    covers = coordinator.platform_devices["cover"]
+    flip = [False]
+    runs = [0]
+
+    def _push_all():
+        flip[0] = not flip[0]
+        runs[0] += 1
+        for device_id in ids:
+            if device_id in covers:
+                push = {"id": device_id, "curtainState": "100" if flip[0] else "0"}
+            else:
+                push = {"id": device_id, "power": flip[0]}
+            session.dispatch_message(ReceivePrefix.DEVICE_UPDATE_PUSH.value, push)
+        loop.run_until_complete(_settle(coordinator))
+
+    writes = coordinator.counters["state_writes"]
+    benchmark.pedantic(_push_all, rounds=_rounds(size), iterations=1)
+    assert coordinator.counters["state_writes"] - writes == size * runs[0]
+    benchmark.extra_info["devices"] = size
+    if benchmark.stats:
+        benchmark.extra_info["updates_per_s"] = round(
+            size / benchmark.stats.stats.median
+        )
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES)
+def test_hub_flap_fan_out(benchmark, loop, fleet_cleanup, size):
+    """Every hub going offline or back online, fanned out to its children."""
+    coordinator, session, _ = build_fleet(loop, make_fleet(size))
+    fleet_cleanup.append(coordinator)
+    hub_ids = coordinator.hub_ids
+    online = [True]
+    runs = [0]
+
+    def _flap_all():
+        online[0] = not online[0]
+        runs[0] += 1
+        for hub_id in hub_ids:
+            session.dispatch_message(
+                ReceivePrefix.DEVICE_UPDATE_PUSH.value,
+                {"id": hub_id, "onLine": online[0]},
+            )
+        loop.run_until_complete(_settle(coordinator))
+
+    signals = coordinator.counters["update_signals"]
+    benchmark.pedantic(_flap_all, rounds=_rounds(size), iterations=1)
+    assert coordinator.counters["update_signals"] - signals == size * runs[0]
+    benchmark.extra_info["devices"] = size
+    benchmark.extra_info["hubs"] = len(hub_ids)
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES)
+def test_memory_per_device(benchmark, loop, fleet_cleanup, size):
+    """Memory held by the session, coordinator and entities per device.
+
+    The timing of this benchmark includes tracemalloc overhead; compare
+    the bytes_per_device extra info instead.
+    """
+    fleet = make_fleet(size)
+    held = []
+
+    def _measure():
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            built = build_fleet(loop, fleet)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        fleet_cleanup.append(built[0])
+        held.append(after - before)
+
+    benchmark.pedantic(_measure, rounds=1, iterations=1)
+    benchmark.extra_info["devices"] = size
+    benchmark.extra_info["bytes_per_device"] = round(held[0] / size)
@@ -0,0 +1,79 @@
+"""Benchmark of the update path on captured, or synthetic, event streams.
+
+The devices a capture discovers are set up first, with their entities;
+the rest of the capture is then replayed through the coordinator's real
+session and timed until every entity write is done.
+"""
+import asyncio
+
+import pytest
+from homismart_client.enums import ReceivePrefix
+
+from bench_fleet import _settle, build_fleet
+from custom_components.homismart.capture import async_replay, read_capture
+import test_integration as stubs
+from homismart_server import make_fleet
+
+SYNTHETIC_DEVICES = 1000
+SYNTHETIC_ROUNDS = 10
+
+
+@pytest.fixture(scope="module")
+def capture_path(request, tmp_path_factory):
+    """Return the capture to replay, recording a synthetic one if needed."""
+    if path := request.config.getoption("--replay-file"):
+        return path
+    tmp_path = tmp_path_factory.mktemp("capture")
+    path = str(tmp_path / "synthetic.jsonl")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def _record():
+        coordinator, _, session = stubs._make_capturing_coordinator(tmp_path)
+        await coordinator.async_start_capture(path, 3600)
+        fleet = make_fleet(SYNTHETIC_DEVICES)
+        session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, fleet)
+        for round_ in range(SYNTHETIC_ROUNDS):
+            for device in fleet:
+                if device["id"].startswith("00"):
+                    continue
+                if "curtainState" in device:
+                    push = {"id": device["id"], "curtainState": str(round_ * 10)}
+                else:
+                    push = {"id": device["id"], "power": round_ % 2 == 0}
+                session.dispatch_message(ReceivePrefix.DEVICE_UPDATE_PUSH.value, push)
+        await coordinator.disconnect()
+
+    loop.run_until_complete(_record())
+    loop.close()
+    asyncio.set_event_loop(None)
+    return path
+
+
+def test_replay(benchmark, loop, fleet_cleanup, capture_path, request):
+    """Replay of everything after discovery, through to the entity writes."""
+    events = read_capture(capture_path)
+    discovered = {}
+    for captured in events:
+        if captured.event.startswith("new_"):
+            discovered.setdefault(captured.raw["id"], captured.raw)
+    updates = [captured for captured in events if not captured.event.startswith("new_")]
+    speed = request.config.getoption("--replay-speed")
+
+    def _setup():
+        coordinator, _, _ = build_fleet(loop, list(discovered.values()))
+        fleet_cleanup.append(coordinator)
+        return (coordinator,), {}
+
+    def _replay(coordinator):
+        loop.run_until_complete(async_replay(coordinator, updates, speed))
+        loop.run_until_complete(_settle(coordinator))
+
+    benchmark.pedantic(_replay, setup=_setup, rounds=3)
+    benchmark.extra_info["devices"] = len(discovered)
+    benchmark.extra_info["events"] = len(updates)
+    # benchmark.stats is None with --benchmark-disable.
+    if benchmark.stats:
+        benchmark.extra_info["events_per_s"] = round(
+            len(updates) / benchmark.stats.stats.median
+        )
@@ -0,0 +1,68 @@
+"""End-to-end benchmarks against the local stand-in server.
+
+A real HomismartClient logs in over a local WebSocket, so JSON decoding
+and the client's receive loop are included, unlike in bench_fleet.
+"""
+
+import pytest
+
+import test_integration as stubs
+from homismart_server import HomismartServer, make_fleet
+
+# The device list arrives in one frame, and the client keeps websockets'
+# default 1 MiB frame limit, which about 8,500 synthetic devices exceed.
+FLEET_SIZES = [100, 1000, 5000]
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES)
+def test_connect_and_discover(benchmark, loop, size):
+    """Login and the full device list, until every device is known."""
+    server = HomismartServer(make_fleet(size))
+    loop.run_until_complete(server.start())
+
+    async def _connect():
+        coordinator = stubs._make_live_coordinator(server)
+        try:
+            await coordinator.connect()
+            await stubs._wait_for(
+                lambda: len(coordinator.device_registry) == len(server.devices),
+                timeout=60,
+            )
+        finally:
+            await coordinator.disconnect()
+
+    benchmark.pedantic(
+        lambda: loop.run_until_complete(_connect()), rounds=3, iterations=1
+    )
+    loop.run_until_complete(server.stop())
+    benchmark.extra_info["devices"] = size
+
+
+@pytest.mark.parametrize("rate", [1000, 10000])
+def test_push_rate(benchmark, loop, rate):
+    """Pushes at a fixed rate to 1,000 devices, until all are received."""
+    server = HomismartServer(make_fleet(1000))
+    loop.run_until_complete(server.start())
+    coordinator = stubs._make_live_coordinator(server)
+    loop.run_until_complete(coordinator.connect())
+
+    async def _pushes():
+        before = coordinator.event_counts["device_updated"]
+        sent = await server.run_pushes(rate, duration=0.5)
+        await stubs._wait_for(
+            lambda: coordinator.event_counts["device_updated"] - before == sent,
+            timeout=60,
+        )
+        return sent
+
+    sent = benchmark.pedantic(
+        lambda: loop.run_until_complete(_pushes()), rounds=3, iterations=1
+    )
+    loop.run_until_complete(coordinator.disconnect())
+    loop.run_until_complete(server.stop())
+    benchmark.extra_info["pushes"] = sent
+    # benchmark.stats is None with --benchmark-disable.
+    if benchmark.stats:
+        benchmark.extra_info["lag_ms"] = round(
+            (benchmark.stats.stats.median - 0.5) * 1000, 1
+        )
@@ -0,0 +1,107 @@
+"""Benchmarks of the update flush: direct subscriptions vs dispatcher signals.
+
+Entities used to listen to a dispatcher signal per device,
+``homismart_update_<device id>``, sent once per dirty device. They now
+subscribe to the coordinator, which calls them directly. The dispatcher
+side is a stand-in following Home Assistant's async_dispatcher_connect and
+async_dispatcher_send: a signal -> {target: job} dict in hass.data, a copy
+of the targets per send and the job run through the hass.
+"""
+import pytest
+
+import test_integration as stubs
+
+LISTENER_COUNTS = [100, 1000, 10000]
+SIGNAL_UPDATE_DEVICE = "homismart_update"
+DATA_DISPATCHER = "dispatcher"
+
+
+class _HassJob:
+    """Stand-in for homeassistant.core.HassJob wrapping a callback."""
+
+    __slots__ = ("target",)
+
+    def __init__(self, target):
+        self.target = target
+
+
+class _Hass:
+    """The parts of HomeAssistant the dispatcher uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def async_run_hass_job(self, job, *args):
+        # A callback job runs in place.
+        return job.target(*args)
+
+
+def _dispatcher_connect(hass, signal, target):
+    """Connect *target* to *signal*, as async_dispatcher_connect does."""
+    dispatchers = hass.data.setdefault(DATA_DISPATCHER, {})
+    dispatchers.setdefault(signal, {})[target] = None
+
+    def _remove():
+        del dispatchers[signal][target]
+
+    return _remove
+
+
+def _dispatcher_send(hass, signal, *args):
+    """Call the targets of *signal*, as async_dispatcher_send does."""
+    if (dispatchers := hass.data.get(DATA_DISPATCHER)) is None:
+        return
+    if (target_list := dispatchers.get(signal)) is None:
+        return
+    for target, job in list(target_list.items()):
+        if job is None:
+            job = target_list[target] = _HassJob(target)
+        hass.async_run_hass_job(job, *args)
+
+
+def _listener():
+    calls = [0]
+
+    def _update():
+        calls[0] += 1
+
+    return calls, _update
+
+
+@pytest.mark.parametrize("listeners", LISTENER_COUNTS)
+def test_direct_subscriptions(benchmark, loop, fleet_cleanup, listeners):
+    """One flush notifying every device's entity through its subscription."""
+    coordinator, _, _ = stubs._make_coordinator()
+    fleet_cleanup.append(coordinator)
+    ids = [f"dev{i}" for i in range(listeners)]
+    calls, update = _listener()
+    for device_id in ids:
+        coordinator.async_subscribe_device(device_id, update)
+
+    def _flush():
+        coordinator._dirty_devices = set(ids)
+        coordinator._async_flush_updates()
+
+    benchmark.group = f"{listeners} listeners"
+    benchmark(_flush)
+    assert calls[0] >= listeners
+    benchmark.extra_info["listeners"] = listeners
+
+
+@pytest.mark.parametrize("listeners", LISTENER_COUNTS)
+def test_dispatcher_signals(benchmark, listeners):
+    """The same notifications as one dispatcher signal per device."""
+    hass = _Hass()
+    ids = [f"dev{i}" for i in range(listeners)]
+    calls, update = _listener()
+    for device_id in ids:
+        _dispatcher_connect(hass, f"{SIGNAL_UPDATE_DEVICE}_{device_id}", update)
+
+    def _flush():
+        for device_id in set(ids):
+            _dispatcher_send(hass, f"{SIGNAL_UPDATE_DEVICE}_{device_id}")
+
+    benchmark.group = f"{listeners} listeners"
+    benchmark(_flush)
+    assert calls[0] >= listeners
+    benchmark.extra_info["listeners"] = listeners
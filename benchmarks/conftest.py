@@ -0,0 +1,60 @@
+"""Shared fixtures for the HomiSmart benchmarks.
+
+The benchmarks reuse the Home Assistant stubs of the unit tests, so they
+run without Home Assistant or a HomiSmart server. They are not collected
+by a plain ``pytest`` run; pass the files explicitly:
+
+    pytest benchmarks/bench_*.py --benchmark-disable-gc --benchmark-json=benchmark.json
+
+bench_replay replays a capture taken with the homismart.start_capture
+service when given ``--replay-file``, otherwise a synthetic one.
+"""
+import asyncio
+import logging
+import os
+import sys
+
+import pytest
+
+tests_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tests"))
+if tests_dir not in sys.path:
+    sys.path.insert(0, tests_dir)
+
+# Importing the unit tests installs the Home Assistant stubs.
+import test_integration  # noqa: E402,F401
+
+# Match a production log level, so per-push info logging is not measured.
+logging.getLogger("homismart_client").setLevel(logging.WARNING)
+logging.getLogger("custom_components.homismart").setLevel(logging.WARNING)
+
+
+def pytest_addoption(parser):
+    """Add the options of the replay benchmark."""
+    parser.addoption("--replay-file", help="Event capture to replay")
+    parser.addoption(
+        "--replay-speed",
+        type=float,
+        help="Replay speed, e.g. 1 for real time; as fast as possible if unset",
+    )
+
+
+@pytest.fixture
+def loop():
+    """Provide a fresh event loop for driving coordinator callbacks."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def fleet_cleanup(loop):
+    """Disconnect the coordinators built by a benchmark."""
+    built = []
+    yield built
+    for coordinator in built:
+        loop.run_until_complete(coordinator.disconnect())
+    test_integration.dispatcher_mock.async_dispatcher_connect.side_effect = None
+    test_integration.dispatcher_mock.async_dispatcher_send.side_effect = None
+    test_integration.dispatcher_mock.reset_mock()
@@ -5,30 +5,62 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
 
-from .const import DOMAIN, PLATFORMS
-from .coordinator import HomiSmartCoordinator
+from .const import DOMAIN
+from .coordinator import HomiSmartCoordinator, topology_store
+from .services import async_setup_services, async_unload_services
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up HomiSmart from a config entry."""
     coordinator = HomiSmartCoordinator(hass, entry)
-
-    try:
-        await coordinator.connect()
-    except Exception as exc:
-        raise ConfigEntryNotReady(
-            f"Failed to connect to HomiSmart: {exc}"
-        ) from exc
-
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # With a cached topology, entities are created from it and then
+    # reconciled when the live device list arrives. In background connect
+    # mode they are created up front and stay unavailable until login;
+    # otherwise only once connected, so a failed attempt tears nothing down.
+    await coordinator.async_restore_topology()
+    if coordinator.background_connect:
+        await hass.config_entries.async_forward_entry_setups(
+            entry, coordinator.platforms
+        )
+        coordinator.async_start_background_connect()
+    else:
+        try:
+            await coordinator.connect()
+        except Exception as exc:
+            hass.data[DOMAIN].pop(entry.entry_id)
+            # Stop the timers the restored topology started.
+            await coordinator.disconnect()
+            raise ConfigEntryNotReady(
+                f"Failed to connect to HomiSmart: {exc}"
+            ) from exc
+        await hass.config_entries.async_forward_entry_setups(
+            entry, coordinator.platforms
+        )
+    async_setup_services(hass)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a HomiSmart config entry."""
-    if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        coordinator: HomiSmartCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+    coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
+    if unload_ok := await hass.config_entries.async_unload_platforms(
+        entry, coordinator.platforms
+    ):
+        hass.data[DOMAIN].pop(entry.entry_id)
         await coordinator.disconnect()
+        async_unload_services(hass)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the cached topology of a removed config entry."""
+    await topology_store(hass, entry.entry_id).async_remove()
@@ -0,0 +1,215 @@
+"""Record raw HomiSmart session events to a file, and replay them."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable
+from datetime import datetime, timezone
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from homismart_client.devices import HomismartDevice
+from homismart_client.enums import ReceivePrefix
+from homismart_client.session import HomismartSession
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import CAPTURE_FLUSH_INTERVAL, CAPTURE_FLUSH_LINES
+
+if TYPE_CHECKING:
+    from .coordinator import HomiSmartCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_FORMAT = "homismart-capture"
+CAPTURE_VERSION = 1
+# Session events captured. Each is replayed as a device push, which the
+# session turns back into the same event.
+CAPTURE_EVENTS = ("new_device_added", "device_updated", "new_hub_added", "hub_updated")
+
+
+class CapturedEvent(NamedTuple):
+    """One session event read back from a capture."""
+
+    offset: float
+    event: str
+    raw: dict[str, Any]
+
+
+def _append_lines(path: str, lines: list[str]) -> None:
+    """Append lines to a capture file; runs in the executor."""
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def read_capture(path: str) -> list[CapturedEvent]:
+    """Read a capture file. This does blocking I/O."""
+    with open(path, encoding="utf-8") as file:
+        header = json.loads(file.readline() or "{}")
+        if header.get("format") != CAPTURE_FORMAT:
+            raise ValueError(f"{path} is not a HomiSmart event capture")
+        return [
+            CapturedEvent(line["t"], line["e"], line["d"])
+            for line in map(json.loads, filter(str.strip, file))
+        ]
+
+
+class EventCapture:
+    """Write a session's raw events to a JSON-lines file for a while.
+
+    The first line is a header, every other line one event:
+    {"t": seconds since the start, "e": event, "d": raw device data}.
+    Lines are buffered and appended in the executor, in order.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        session: HomismartSession,
+        path: str,
+        duration: float,
+    ) -> None:
+        """Initialize the capture."""
+        self.hass = hass
+        self.session = session
+        self.path = path
+        self.duration = duration
+        self.events = 0
+        self.active = False
+        self._started = 0.0
+        self._buffer: list[str] = []
+        self._listeners: dict[str, Callable[[HomismartDevice], None]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._write_task: asyncio.Task[None] | None = None
+
+    @callback
+    def async_start(self) -> None:
+        """Start listening to the session's events."""
+        self.active = True
+        self._started = time.monotonic()
+        header = {
+            "format": CAPTURE_FORMAT,
+            "version": CAPTURE_VERSION,
+            "started": datetime.now(timezone.utc).isoformat(),
+        }
+        self._buffer.append(json.dumps(header))
+        for event in CAPTURE_EVENTS:
+            self._listeners[event] = self._recorder(event)
+            self.session.register_event_listener(event, self._listeners[event])
+        self._flush_handle = self.hass.loop.call_later(
+            min(CAPTURE_FLUSH_INTERVAL, self.duration), self._async_flush_timer
+        )
+        _LOGGER.info("Capturing HomiSmart events to %s", self.path)
+
+    def _recorder(self, event: str) -> Callable[[HomismartDevice], None]:
+        """Return the session listener recording one event type."""
+
+        @callback
+        def _async_record(device: HomismartDevice) -> None:
+            # Serialize now: the library updates the raw dict in place.
+            self._buffer.append(
+                json.dumps(
+                    {
+                        "t": round(time.monotonic() - self._started, 3),
+                        "e": event,
+                        "d": device.raw,
+                    },
+                    separators=(",", ":"),
+                )
+            )
+            self.events += 1
+            if len(self._buffer) >= CAPTURE_FLUSH_LINES:
+                self._async_write_buffer()
+
+        return _async_record
+
+    @callback
+    def _async_write_buffer(self) -> None:
+        """Queue the buffered lines behind the writes already queued."""
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        self._write_task = self.hass.async_create_task(
+            self._async_write(self._write_task, lines)
+        )
+
+    async def _async_write(
+        self, previous: asyncio.Task[None] | None, lines: list[str]
+    ) -> None:
+        """Append lines once the previous write is done."""
+        if previous is not None:
+            await previous
+        try:
+            await self.hass.async_add_executor_job(_append_lines, self.path, lines)
+        except OSError as err:
+            _LOGGER.error("Failed to write HomiSmart capture %s: %s", self.path, err)
+
+    @callback
+    def _async_flush_timer(self) -> None:
+        """Write buffered lines, and finish once the duration is up."""
+        self._flush_handle = None
+        remaining = self.duration - (time.monotonic() - self._started)
+        if remaining <= 0:
+            self._async_finish()
+            return
+        self._async_write_buffer()
+        self._flush_handle = self.hass.loop.call_later(
+            min(CAPTURE_FLUSH_INTERVAL, remaining), self._async_flush_timer
+        )
+
+    @callback
+    def _async_finish(self) -> None:
+        """Stop listening and queue the last lines."""
+        if not self.active:
+            return
+        self.active = False
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for event, listener in self._listeners.items():
+            self.session.unregister_event_listener(event, listener)
+        self._listeners.clear()
+        self._async_write_buffer()
+        _LOGGER.info("Captured %d HomiSmart events to %s", self.events, self.path)
+
+    async def async_stop(self) -> None:
+        """Stop the capture, if still running, and wait for the file."""
+        self._async_finish()
+        if self._write_task is not None:
+            await self._write_task
+
+
+async def async_replay(
+    coordinator: HomiSmartCoordinator,
+    events: Iterable[CapturedEvent],
+    speed: float | None = 1.0,
+) -> int:
+    """Push captured events through the coordinator's session.
+
+    Each event is dispatched as a device push, as the client's receive loop
+    would, so the session and the coordinator's listeners handle it for
+    real. A device the session does not know yet is added, anything else
+    updated: replay into a fresh coordinator to reproduce a capture
+    exactly. A speed of 1 keeps the captured timing, 10 replays ten times
+    faster and None as fast as possible, still yielding to the loop between
+    events. Returns the number of events replayed.
+    """
+    session = coordinator.client.session
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first: float | None = None
+    count = 0
+    for captured in events:
+        if first is None:
+            first = captured.offset
+        delay = 0.0
+        if speed is not None:
+            delay = start + (captured.offset - first) / speed - loop.time()
+        await asyncio.sleep(max(delay, 0))
+        # A copy, as the session keeps and updates the dict of a new device.
+        session.dispatch_message(
+            ReceivePrefix.DEVICE_UPDATE_PUSH.value, dict(captured.raw)
+        )
+        count += 1
+    return count
@@ -8,11 +8,37 @@ from homismart_client import AuthenticationError, HomismartClient
 
 from homeassistant import config_entries
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 
-from .const import DOMAIN
+from .const import (
+    CONF_BACKGROUND_CONNECT,
+    CONF_CALLBACK_BUDGET,
+    CONF_COVER_SETTLE_TIME,
+    CONF_EVENT_LOG_SIZE,
+    CONF_HUB_COMMAND_INTERVAL,
+    CONF_HUB_MAX_CONCURRENCY,
+    CONF_LATENCY_SENSORS,
+    CONF_OPTIMISTIC,
+    CONF_OPTIMISTIC_TIMEOUT,
+    CONF_SKIP_REDUNDANT,
+    CONF_STATE_MAX_AGE,
+    CONF_UPDATE_WINDOW,
+    DEFAULT_BACKGROUND_CONNECT,
+    DEFAULT_CALLBACK_BUDGET,
+    DEFAULT_COVER_SETTLE_TIME,
+    DEFAULT_EVENT_LOG_SIZE,
+    DEFAULT_HUB_COMMAND_INTERVAL,
+    DEFAULT_HUB_MAX_CONCURRENCY,
+    DEFAULT_LATENCY_SENSORS,
+    DEFAULT_OPTIMISTIC,
+    DEFAULT_OPTIMISTIC_TIMEOUT,
+    DEFAULT_SKIP_REDUNDANT,
+    DEFAULT_STATE_MAX_AGE,
+    DEFAULT_UPDATE_WINDOW,
+    DOMAIN,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -52,6 +78,14 @@ class HomiSmartConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> "HomiSmartOptionsFlow":
+        """Return the options flow handler."""
+        return HomiSmartOptionsFlow()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -81,3 +115,79 @@ class HomiSmartConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return self.async_show_form(
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
+
+
+class HomiSmartOptionsFlow(config_entries.OptionsFlow):
+    """Handle HomiSmart options."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the performance tuning options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        schema = vol.Schema(
+            {
+                vol.Optional(
+                    CONF_UPDATE_WINDOW,
+                    default=options.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+                vol.Optional(
+                    CONF_BACKGROUND_CONNECT,
+                    default=options.get(
+                        CONF_BACKGROUND_CONNECT, DEFAULT_BACKGROUND_CONNECT
+                    ),
+                ): bool,
+                vol.Optional(
+                    CONF_COVER_SETTLE_TIME,
+                    default=options.get(
+                        CONF_COVER_SETTLE_TIME, DEFAULT_COVER_SETTLE_TIME
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+                vol.Optional(
+                    CONF_OPTIMISTIC,
+                    default=options.get(CONF_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+                ): bool,
+                vol.Optional(
+                    CONF_OPTIMISTIC_TIMEOUT,
+                    default=options.get(
+                        CONF_OPTIMISTIC_TIMEOUT, DEFAULT_OPTIMISTIC_TIMEOUT
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=60)),
+                vol.Optional(
+                    CONF_HUB_MAX_CONCURRENCY,
+                    default=options.get(
+                        CONF_HUB_MAX_CONCURRENCY, DEFAULT_HUB_MAX_CONCURRENCY
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=32)),
+                vol.Optional(
+                    CONF_HUB_COMMAND_INTERVAL,
+                    default=options.get(
+                        CONF_HUB_COMMAND_INTERVAL, DEFAULT_HUB_COMMAND_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+                vol.Optional(
+                    CONF_SKIP_REDUNDANT,
+                    default=options.get(CONF_SKIP_REDUNDANT, DEFAULT_SKIP_REDUNDANT),
+                ): bool,
+                vol.Optional(
+                    CONF_STATE_MAX_AGE,
+                    default=options.get(CONF_STATE_MAX_AGE, DEFAULT_STATE_MAX_AGE),
+                ): vol.All(vol.Coerce(float), vol.Range(min=1, max=3600)),
+                vol.Optional(
+                    CONF_EVENT_LOG_SIZE,
+                    default=options.get(CONF_EVENT_LOG_SIZE, DEFAULT_EVENT_LOG_SIZE),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10000)),
+                vol.Optional(
+                    CONF_CALLBACK_BUDGET,
+                    default=options.get(CONF_CALLBACK_BUDGET, DEFAULT_CALLBACK_BUDGET),
+                ): vol.All(vol.Coerce(float), vol.Range(min=1, max=1000)),
+                vol.Optional(
+                    CONF_LATENCY_SENSORS,
+                    default=options.get(CONF_LATENCY_SENSORS, DEFAULT_LATENCY_SENSORS),
+                ): bool,
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema)
@@ -10,4 +10,84 @@ PLATFORMS = ["light", "cover", "switch"]
 SIGNAL_NEW_LIGHT = "homismart_new_light"
 SIGNAL_NEW_COVER = "homismart_new_cover"
 SIGNAL_NEW_SWITCH = "homismart_new_switch"
-SIGNAL_UPDATE_DEVICE = "homismart_update"
+# Formatted with the config entry ID.
+SIGNAL_NEW_HUB = "homismart_new_hub_{}"
+
+# Seconds to buffer newly discovered devices so each platform adds them
+# in a single batch during the discovery burst after connecting.
+NEW_DEVICE_BATCH_WINDOW = 0.5
+
+# Persistent topology cache, used to create entities before the cloud
+# login and discovery complete.
+STORAGE_VERSION = 1
+TOPOLOGY_SAVE_DELAY = 30
+# Raw device fields kept in the cache: identity, routing and last state.
+TOPOLOGY_FIELDS = ("id", "pid", "type", "name", "onLine", "power", "curtainState", "version")
+
+# Options.
+# Seconds to collect device updates before writing entity states.
+# 0 flushes once per event-loop iteration.
+CONF_UPDATE_WINDOW = "update_window"
+DEFAULT_UPDATE_WINDOW = 0.0
+# Return from setup at once and keep connecting in the background.
+CONF_BACKGROUND_CONNECT = "background_connect"
+DEFAULT_BACKGROUND_CONNECT = False
+# Seconds a cover waits after sending a position before sending the next
+# one. Targets requested meanwhile replace each other; only the last is sent.
+CONF_COVER_SETTLE_TIME = "cover_settle_time"
+DEFAULT_COVER_SETTLE_TIME = 0.5
+# Show the expected state as soon as a command is sent, and roll it back
+# unless the device confirms it within the timeout (seconds).
+CONF_OPTIMISTIC = "optimistic"
+DEFAULT_OPTIMISTIC = False
+CONF_OPTIMISTIC_TIMEOUT = "optimistic_timeout"
+DEFAULT_OPTIMISTIC_TIMEOUT = 5.0
+# Per-hub command scheduling: commands started at once, and the minimum
+# spacing in seconds between command starts.
+CONF_HUB_MAX_CONCURRENCY = "hub_max_concurrency"
+DEFAULT_HUB_MAX_CONCURRENCY = 4
+CONF_HUB_COMMAND_INTERVAL = "hub_command_interval"
+DEFAULT_HUB_COMMAND_INTERVAL = 0.0
+# Add diagnostic sensors with each hub's command round-trip latency.
+CONF_LATENCY_SENSORS = "latency_sensors"
+DEFAULT_LATENCY_SENSORS = False
+# Milliseconds a single coordinator callback or entity state write may
+# take before it is logged as slow.
+CONF_CALLBACK_BUDGET = "callback_budget"
+DEFAULT_CALLBACK_BUDGET = 20.0
+# Recent raw session events kept in memory for troubleshooting.
+CONF_EVENT_LOG_SIZE = "event_log_size"
+DEFAULT_EVENT_LOG_SIZE = 500
+# Skip commands the cached device state shows are already satisfied, as
+# long as that state was pushed within the last state_max_age seconds.
+CONF_SKIP_REDUNDANT = "skip_redundant"
+DEFAULT_SKIP_REDUNDANT = False
+CONF_STATE_MAX_AGE = "state_max_age"
+DEFAULT_STATE_MAX_AGE = 60.0
+
+# Device pushes waiting to be processed, at most one per device. Beyond
+# the bound the oldest is processed at once. The queue is drained in
+# slices of at most INGEST_SLICE seconds, yielding to the loop in between.
+INGEST_MAX_PENDING = 5000
+INGEST_SLICE = 0.005
+
+# Seconds a command waits for the push confirming it before it counts
+# as timed out. Covers report their target level only after moving.
+COMMAND_CONFIRM_TIMEOUT = 60
+
+# Seconds between slow-callback warnings for the same callback.
+SLOW_CALLBACK_LOG_INTERVAL = 60
+
+# Resyncs after (re)authentication kept for diagnostics.
+RESYNC_HISTORY_SIZE = 10
+
+# Event captures for record and replay: default and longest duration in
+# seconds, and how often, or after how many lines, buffered lines are written.
+CAPTURE_DEFAULT_DURATION = 600
+CAPTURE_MAX_DURATION = 86400
+CAPTURE_FLUSH_INTERVAL = 5
+CAPTURE_FLUSH_LINES = 1000
+
+# Backoff between background connection attempts, in seconds.
+CONNECT_RETRY_BASE_DELAY = 5
+CONNECT_RETRY_MAX_DELAY = 300
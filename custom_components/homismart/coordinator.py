@@ -1,26 +1,177 @@
 """Data Coordinator for the HomiSmart integration."""
+import asyncio
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
 import logging
+import random
+import time
+from typing import Any
 
 from homismart_client import HomismartClient
 from homismart_client.devices import CurtainDevice, HomismartDevice, SwitchableDevice
-from homismart_client.enums import DeviceType
+from homismart_client.enums import DeviceType, ReceivePrefix
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
 
 from .const import (
+    CONF_BACKGROUND_CONNECT,
+    CONF_CALLBACK_BUDGET,
+    CONF_COVER_SETTLE_TIME,
+    CONF_EVENT_LOG_SIZE,
+    CONF_HUB_COMMAND_INTERVAL,
+    CONF_HUB_MAX_CONCURRENCY,
+    CONF_LATENCY_SENSORS,
+    CONF_OPTIMISTIC,
+    CONF_OPTIMISTIC_TIMEOUT,
+    CONF_SKIP_REDUNDANT,
+    CONF_STATE_MAX_AGE,
+    CONF_UPDATE_WINDOW,
+    CONNECT_RETRY_BASE_DELAY,
+    CONNECT_RETRY_MAX_DELAY,
+    DEFAULT_BACKGROUND_CONNECT,
+    DEFAULT_CALLBACK_BUDGET,
+    DEFAULT_COVER_SETTLE_TIME,
+    DEFAULT_EVENT_LOG_SIZE,
+    DEFAULT_HUB_COMMAND_INTERVAL,
+    COMMAND_CONFIRM_TIMEOUT,
+    DEFAULT_HUB_MAX_CONCURRENCY,
+    DEFAULT_LATENCY_SENSORS,
+    DEFAULT_OPTIMISTIC,
+    DEFAULT_OPTIMISTIC_TIMEOUT,
+    DEFAULT_SKIP_REDUNDANT,
+    DEFAULT_STATE_MAX_AGE,
+    DEFAULT_UPDATE_WINDOW,
     DOMAIN,
+    INGEST_MAX_PENDING,
+    INGEST_SLICE,
+    NEW_DEVICE_BATCH_WINDOW,
+    PLATFORMS,
+    RESYNC_HISTORY_SIZE,
+    SLOW_CALLBACK_LOG_INTERVAL,
     SIGNAL_NEW_COVER,
+    SIGNAL_NEW_HUB,
     SIGNAL_NEW_LIGHT,
     SIGNAL_NEW_SWITCH,
-    SIGNAL_UPDATE_DEVICE,
+    STORAGE_VERSION,
+    TOPOLOGY_FIELDS,
+    TOPOLOGY_SAVE_DELAY,
 )
+from .capture import EventCapture
+from .scheduler import CommandScheduler
+from .stats import LatencySamples
 
 _LOGGER = logging.getLogger(__name__)
 
+# Vendor naming: "SWITCH" (type 2) = wall light switches -> HA lights
+#                "SOCKET" (type 1) = power outlets -> HA switches
+# Add other device types (e.g., locks) here in the future.
+DEVICE_TYPE_PLATFORMS: dict[DeviceType, str] = {
+    DeviceType.SOCKET: "switch",
+    DeviceType.DOUBLE_SWITCH_OR_SOCKET: "switch",
+    DeviceType.SOCKET_ALT: "switch",
+    DeviceType.SWITCH_MULTI_GANG_A: "switch",
+    DeviceType.SWITCH: "light",
+    DeviceType.CURTAIN: "cover",
+    DeviceType.SHUTTER: "cover",
+}
+
+# Bulk command actions -> device methods.
+BULK_ACTIONS: dict[str, str] = {
+    "on": "turn_on",
+    "off": "turn_off",
+    "toggle": "toggle",
+    "open": "open_fully",
+    "close": "close_fully",
+    "set_level": "set_level",
+    "stop": "stop",
+}
+
+# Commands whose outcome is a known state: action -> (attribute, value).
+# A value of None means the command's first argument.
+COMMAND_TARGET_STATES: dict[str, tuple[str, Any]] = {
+    "turn_on": ("is_on", True),
+    "turn_off": ("is_on", False),
+    "open_fully": ("current_level", 0),
+    "close_fully": ("current_level", 100),
+    "set_level": ("current_level", None),
+}
+
+PLATFORM_SIGNALS: dict[str, str] = {
+    "light": SIGNAL_NEW_LIGHT,
+    "switch": SIGNAL_NEW_SWITCH,
+    "cover": SIGNAL_NEW_COVER,
+}
+
+
+def device_fingerprint(device: HomismartDevice) -> tuple[Any, ...]:
+    """Return the device properties Home Assistant shows, for cheap comparison."""
+    return (
+        device.name,
+        device.is_online,
+        getattr(device, "is_on", None),
+        getattr(device, "current_level", None),
+        device.pid,
+        device.version,
+        device.device_type_code,
+    )
+
+
+def _topology_key(fingerprint: tuple[Any, ...]) -> tuple[Any, ...]:
+    """Return the name, hub and type of a fingerprint, as the cache needs them."""
+    name, _, _, _, pid, _, type_code = fingerprint
+    return name, pid, type_code
+
+
+def _payload_size(*args: Any) -> int:
+    """Return the number of items in a callback's payload: one per device."""
+    return sum(len(arg) if isinstance(arg, list) else 1 for arg in args)
+
+
+def _device_type_name(device: HomismartDevice) -> str:
+    """Return a readable device type, e.g. "CURTAIN"."""
+    if device.device_type_enum is not None:
+        return device.device_type_enum.name
+    return str(device.device_type_code)
+
+
+def _device_metadata(device: HomismartDevice) -> tuple[Any, ...]:
+    """Return what a device's DeviceInfo is built from.
+
+    The name and firmware version come first, as those are the fields
+    written back to HA's device registry.
+    """
+    version = device.version
+    return (
+        device.name,
+        str(version) if version is not None else None,
+        device.device_type_code,
+        device.pid,
+    )
+
+
+def platform_for_device(device: HomismartDevice) -> str | None:
+    """Return the entity platform a device belongs to, if any."""
+    device_type = device.device_type_enum
+    if device_type is None:
+        # Fall back to instance checks when type is unknown.
+        if isinstance(device, SwitchableDevice):
+            return "light"
+        if isinstance(device, CurtainDevice):
+            return "cover"
+        return None
+    return DEVICE_TYPE_PLATFORMS.get(device_type)
+
+
+def topology_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Return the store of a config entry's cached topology."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.topology")
+
 
 class HomiSmartCoordinator:
     """Manages a single HomiSmart connection and dispatches data to entities."""
@@ -35,93 +186,882 @@ class HomiSmartCoordinator:
             loop=hass.loop,
         )
         self.device_registry: dict[str, HomismartDevice] = {}
+        # Platform -> devices routed to it, so platforms never scan hubs or
+        # each other's devices.
+        self.platform_devices: dict[str, dict[str, HomismartDevice]] = {
+            platform: {} for platform in PLATFORMS
+        }
+        # Hub ID (device pid) -> IDs of the devices behind that hub.
+        self.hub_children: dict[str, set[str]] = {}
+        self._device_hub: dict[str, str | None] = {}
+        self._hub_online: dict[str, bool] = {}
+        # Cheap running counters, e.g. events received and signals sent.
+        self.counters: Counter[str] = Counter()
+        self.started = time.monotonic()
+        # Session events received, by type.
+        self.event_counts: Counter[str] = Counter()
+        # Calls of, and seconds spent in, the coordinator's callbacks and
+        # entity state writes; calls over the budget are logged.
+        self.callback_calls: Counter[str] = Counter()
+        self.callback_time: Counter[str] = Counter()
+        self.callback_max: Counter[str] = Counter()
+        self.callback_over_budget: Counter[str] = Counter()
+        self.callback_budget: float = (
+            entry.options.get(CONF_CALLBACK_BUDGET, DEFAULT_CALLBACK_BUDGET) / 1000
+        )
+        self._slow_logged: dict[str, float] = {}
+        # Command round trips, from the call to the message being sent.
+        self.command_latency = LatencySamples()
+        # Commands awaiting their confirming push: device ID -> (sent at,
+        # hub ID, device type, expected attribute, expected value).
+        self._awaiting_confirm: dict[
+            str, tuple[float, str, str, str | None, Any]
+        ] = {}
+        self._confirm_sweep: asyncio.TimerHandle | None = None
+        # Command -> confirming push latency, per hub and per device type.
+        self.confirm_latency_by_hub: dict[str, LatencySamples] = {}
+        self.confirm_latency_by_type: dict[str, LatencySamples] = {}
+        self.confirm_timeouts_by_hub: Counter[str] = Counter()
+        self.latency_sensors: bool = entry.options.get(
+            CONF_LATENCY_SENSORS, DEFAULT_LATENCY_SENSORS
+        )
+        # Device updates are coalesced: pushes only mark a device dirty and
+        # a single flush per window notifies each dirty device once.
+        self.update_window: float = entry.options.get(
+            CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW
+        )
+        self._dirty_devices: set[str] = set()
+        self._flush_handle: asyncio.Handle | None = None
+        self._timed_flush_updates = self._timed(
+            "flush_updates",
+            self._async_flush_updates,
+            lambda: len(self._dirty_devices),
+        )
+        # Device pushes waiting to be processed, latest per device, drained
+        # in time slices so a full-state dump does not block the loop.
+        self._ingest_pending: dict[str, HomismartDevice] = {}
+        self._ingest_handle: asyncio.Handle | None = None
+        self._timed_drain_updates = self._timed(
+            "drain_updates",
+            self._async_drain_updates,
+            lambda: len(self._ingest_pending),
+        )
+        self.ingest_high_water = 0
+        # Device ID -> entity update callbacks, called directly on flush.
+        self._device_listeners: dict[str, list[Callable[[], None]]] = {}
+        # New devices are announced to the platforms in batches, as lists.
+        self.new_device_window: float = NEW_DEVICE_BATCH_WINDOW
+        self._pending_new_devices: dict[str, list[HomismartDevice]] = {}
+        self._new_device_handle: asyncio.Handle | None = None
+        # Last known topology, persisted so the next start can create
+        # entities before the cloud connection is up.
+        self._store = topology_store(hass, entry.entry_id)
+        self._topology_save_pending = False
+        self._listeners_registered = False
+        self.background_connect: bool = entry.options.get(
+            CONF_BACKGROUND_CONNECT, DEFAULT_BACKGROUND_CONNECT
+        )
+        self._connect_task: asyncio.Task | None = None
+        self.cover_settle_time: float = entry.options.get(
+            CONF_COVER_SETTLE_TIME, DEFAULT_COVER_SETTLE_TIME
+        )
+        self.optimistic: bool = entry.options.get(CONF_OPTIMISTIC, DEFAULT_OPTIMISTIC)
+        self.optimistic_timeout: float = entry.options.get(
+            CONF_OPTIMISTIC_TIMEOUT, DEFAULT_OPTIMISTIC_TIMEOUT
+        )
+        # Named scene snapshots: name -> device ID -> recorded state.
+        self.snapshots: dict[str, dict[str, dict[str, Any]]] = {}
+        # The running or last finished capture of raw session events.
+        self.capture: EventCapture | None = None
+        self.skip_redundant: bool = entry.options.get(
+            CONF_SKIP_REDUNDANT, DEFAULT_SKIP_REDUNDANT
+        )
+        self.state_max_age: float = entry.options.get(
+            CONF_STATE_MAX_AGE, DEFAULT_STATE_MAX_AGE
+        )
+        # Device ID -> monotonic time its state was last pushed. Devices
+        # restored from the topology cache have no entry until a live push.
+        self._state_seen: dict[str, float] = {}
+        self._restoring = False
+        # Device ID -> commands queued or being sent.
+        self._commands_in_flight: Counter[str] = Counter()
+        # After each login the server resends the device list. Devices whose
+        # fingerprint did not change since are not pushed to HA again.
+        self._fingerprints: dict[str, tuple[Any, ...]] = {}
+        # Device or hub ID -> metadata last written to HA's device registry.
+        self._registered_metadata: dict[str, tuple[Any, ...]] = {}
+        # Device ID -> revision, bumped whenever its metadata changes, so
+        # entities know when to rebuild their cached DeviceInfo.
+        self.metadata_revisions: dict[str, int] = {}
+        self._authenticated_before = False
+        self._resync_remaining: set[str] = set()
+        self._resync_started = 0.0
+        self._resync_changed = 0
+        self._resync_unchanged = 0
+        self.resync_history: deque[dict[str, Any]] = deque(maxlen=RESYNC_HISTORY_SIZE)
+        # Ring buffer of recent raw session events:
+        # (wall time, event, device ID, raw payload).
+        self.event_log: deque[tuple[float, str, str, dict[str, Any]]] = deque(
+            maxlen=entry.options.get(CONF_EVENT_LOG_SIZE, DEFAULT_EVENT_LOG_SIZE)
+        )
+        self.scheduler = CommandScheduler(
+            entry.options.get(CONF_HUB_MAX_CONCURRENCY, DEFAULT_HUB_MAX_CONCURRENCY),
+            entry.options.get(CONF_HUB_COMMAND_INTERVAL, DEFAULT_HUB_COMMAND_INTERVAL),
+        )
 
     @callback
     def _handle_new_device(self, device: HomismartDevice) -> None:
         """Handle a new device discovered by the client and dispatch it."""
         try:
             _LOGGER.info("Discovered new HomiSmart device: %s", device)
+            self._record_event("new_device_added", device)
+            # A known device re-created, e.g. with a new type: a queued push
+            # for the old object must not overwrite the new one.
+            self._ingest_pending.pop(device.id, None)
+            if device.id in self._resync_remaining:
+                self._async_resync_seen(device.id, changed=True)
             self.device_registry[device.id] = device
+            if not self._restoring:
+                self._state_seen[device.id] = time.monotonic()
+            self._fingerprints[device.id] = device_fingerprint(device)
+            self._async_update_device_metadata(device)
+            self._async_index_device(device)
+            self._async_schedule_topology_save()
 
-            device_type = device.device_type_enum
-
-            if device_type is None:
-                # Fall back to instance checks when type is unknown.
-                if isinstance(device, SwitchableDevice):
-                    async_dispatcher_send(self.hass, SIGNAL_NEW_LIGHT, device)
-                elif isinstance(device, CurtainDevice):
-                    async_dispatcher_send(self.hass, SIGNAL_NEW_COVER, device)
+            platform = platform_for_device(device)
+            # A device re-created with a new type may have moved platform.
+            for devices in self.platform_devices.values():
+                devices.pop(device.id, None)
+            if platform is None:
                 return
-
-            # Vendor naming: "SWITCH" (type 2) = wall light switches -> HA lights
-            #                "SOCKET" (type 1) = power outlets -> HA switches
-            if device_type in (
-                DeviceType.SOCKET,
-                DeviceType.DOUBLE_SWITCH_OR_SOCKET,
-                DeviceType.SOCKET_ALT,
-                DeviceType.SWITCH_MULTI_GANG_A,
-            ):
-                async_dispatcher_send(self.hass, SIGNAL_NEW_SWITCH, device)
-            elif device_type == DeviceType.SWITCH:
-                async_dispatcher_send(self.hass, SIGNAL_NEW_LIGHT, device)
-            elif device_type in (DeviceType.CURTAIN, DeviceType.SHUTTER):
-                async_dispatcher_send(self.hass, SIGNAL_NEW_COVER, device)
-            # Add other device types (e.g., locks) here in the future.
+            self.platform_devices[platform][device.id] = device
+            self._async_announce(PLATFORM_SIGNALS[platform], device)
         except Exception:
             _LOGGER.exception(
                 "Error handling new device: %s",
                 getattr(device, "id", "unknown"),
             )
 
+    def _record_event(self, event: str, device: HomismartDevice) -> None:
+        """Count a session event and append it to the event log."""
+        self.event_counts[event] += 1
+        if self.event_log.maxlen:
+            self.event_log.append((time.time(), event, device.id, device.raw))
+
+    @property
+    def hub_ids(self) -> list[str]:
+        """Return the IDs of the known hubs."""
+        return list(self._hub_online)
+
+    @property
+    def platforms(self) -> list[str]:
+        """Return the entity platforms to set up for this entry."""
+        if self.latency_sensors:
+            return [*PLATFORMS, "sensor"]
+        return PLATFORMS
+
+    @callback
+    def async_device_counts(self) -> dict[str, int]:
+        """Return the number of hubs, and of devices per platform."""
+        counts = {"hubs": len(self._hub_online)}
+        routed = 0
+        for platform, devices in self.platform_devices.items():
+            counts[platform] = len(devices)
+            routed += len(devices)
+        counts["unsupported"] = len(self.device_registry) - counts["hubs"] - routed
+        return counts
+
+    @callback
+    def async_dump_events(
+        self, device_ids: list[str] | None = None
+    ) -> list[dict[str, Any]]:
+        """Return the recorded events, oldest first, optionally for some devices."""
+        wanted = set(device_ids) if device_ids else None
+        return [
+            {
+                "time": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "event": event,
+                "device_id": device_id,
+                "payload": payload,
+            }
+            for ts, event, device_id, payload in self.event_log
+            if wanted is None or device_id in wanted
+        ]
+
+    @callback
+    def _async_announce(self, signal: str, device: HomismartDevice) -> None:
+        """Buffer a new device until the next batch is sent to its platform."""
+        self._pending_new_devices.setdefault(signal, []).append(device)
+        if self._new_device_handle is None:
+            self._new_device_handle = self.hass.loop.call_later(
+                self.new_device_window, self._async_flush_new_devices
+            )
+
+    @callback
+    def _async_flush_new_devices(self) -> None:
+        """Send each platform the list of devices discovered since the last batch."""
+        self._new_device_handle = None
+        pending, self._pending_new_devices = self._pending_new_devices, {}
+        for signal, devices in pending.items():
+            async_dispatcher_send(self.hass, signal, devices)
+
+    @callback
+    def _async_enqueue_update(self, device: HomismartDevice) -> None:
+        """Queue a device push, replacing one still pending for the device."""
+        self._record_event("device_updated", device)
+        if device.id in self._awaiting_confirm:
+            self._async_check_confirmation(device)
+        pending = self._ingest_pending
+        if device.id in pending:
+            self.counters["ingest_superseded"] += 1
+        elif len(pending) >= INGEST_MAX_PENDING:
+            # Full: make room by processing the oldest push right away.
+            self.counters["ingest_overflow"] += 1
+            self._handle_device_update(pending.pop(next(iter(pending))))
+        pending[device.id] = device
+        self.ingest_high_water = max(self.ingest_high_water, len(pending))
+        if self._ingest_handle is None:
+            self._ingest_handle = self.hass.loop.call_soon(self._timed_drain_updates)
+
+    @callback
+    def _async_drain_updates(self) -> None:
+        """Process queued pushes for one time slice, then yield to the loop."""
+        self._ingest_handle = None
+        pending = self._ingest_pending
+        deadline = time.monotonic() + INGEST_SLICE
+        self.counters["ingest_slices"] += 1
+        while pending:
+            device_id = next(iter(pending))
+            self._handle_device_update(pending.pop(device_id))
+            if time.monotonic() >= deadline:
+                break
+        if pending:
+            self._ingest_handle = self.hass.loop.call_soon(self._timed_drain_updates)
+
     @callback
     def _handle_device_update(self, device: HomismartDevice) -> None:
         """Handle a device state update and dispatch the signal."""
-        _LOGGER.debug("Device state updated: %s", device.raw)
+        self.counters["device_updated"] += 1
+        self._state_seen[device.id] = time.monotonic()
+        fingerprint = device_fingerprint(device)
+        previous = self._fingerprints.get(device.id)
+        if device.id in self._resync_remaining:
+            unchanged = (
+                previous == fingerprint
+                and self.device_registry.get(device.id) is device
+            )
+            self._async_resync_seen(device.id, changed=not unchanged)
+            if unchanged:
+                # Its entities may still have been written while disconnected,
+                # or restored from the cache: let them write their availability.
+                self._async_mark_dirty(device.id)
+                return
+        self._fingerprints[device.id] = fingerprint
         self.device_registry[device.id] = device
-        # Dispatch an update signal specific to this device's ID.
-        async_dispatcher_send(self.hass, f"{SIGNAL_UPDATE_DEVICE}_{device.id}")
+        self._async_update_device_metadata(device)
+        self._async_index_device(device)
+        # State changes alone are written on disconnect, not on every push.
+        if previous is None or _topology_key(previous) != _topology_key(fingerprint):
+            self._async_schedule_topology_save()
+        self._async_mark_dirty(device.id)
+
+    @callback
+    def _handle_device_removed(self, device: HomismartDevice) -> None:
+        """Forget a device or hub that was removed from the account."""
+        _LOGGER.info("HomiSmart device removed: %s", device)
+        self._record_event("device_deleted", device)
+        self._ingest_pending.pop(device.id, None)
+        self.device_registry.pop(device.id, None)
+        self._state_seen.pop(device.id, None)
+        self._fingerprints.pop(device.id, None)
+        self._registered_metadata.pop(device.id, None)
+        if device.id in self._resync_remaining:
+            self._async_resync_seen(device.id, changed=True)
+        for devices in self.platform_devices.values():
+            devices.pop(device.id, None)
+        old_pid = self._device_hub.pop(device.id, None)
+        if old_pid is not None:
+            self.hub_children.get(old_pid, set()).discard(device.id)
+        self.hub_children.pop(device.id, None)
+        self._hub_online.pop(device.id, None)
+        self._async_schedule_topology_save()
+
+    @callback
+    def _handle_new_hub(self, hub: HomismartDevice) -> None:
+        """Handle a hub discovered by the client."""
+        _LOGGER.info("Discovered new HomiSmart hub: %s", hub.name)
+        self._record_event("new_hub_added", hub)
+        self._async_update_hub(hub)
 
     @callback
     def _handle_hub_update(self, hub: HomismartDevice) -> None:
-        """Handle a hub discovery or update and register it in HA's device registry."""
+        """Handle a hub update."""
         _LOGGER.info("Hub update: %s (online=%s)", hub.name, hub.is_online)
+        self._record_event("hub_updated", hub)
+        self._async_update_hub(hub)
+
+    @callback
+    def _async_update_hub(self, hub: HomismartDevice) -> None:
+        """Track a hub and register it in HA's device registry."""
         self.device_registry[hub.id] = hub
         # Register the hub in HA's device registry so child entities can
-        # reference it via via_device.
+        # reference it via via_device. Online pings change nothing there, nor
+        # in the cached topology, so only new hubs and renames are written.
+        if self._registered_metadata.get(hub.id) != (hub.name,):
+            self._registered_metadata[hub.id] = (hub.name,)
+            self._async_schedule_topology_save()
+            dev_reg = dr.async_get(self.hass)
+            dev_reg.async_get_or_create(
+                config_entry_id=self.entry.entry_id,
+                identifiers={(DOMAIN, hub.id)},
+                name=hub.name,
+                manufacturer="HomiSmart",
+                model="Hub",
+            )
+        # Only the hub's own children can be affected, and only when its
+        # online state actually flipped.
+        was_online = self._hub_online.get(hub.id)
+        self._hub_online[hub.id] = hub.is_online
+        if was_online is None:
+            async_dispatcher_send(
+                self.hass, SIGNAL_NEW_HUB.format(self.entry.entry_id), [hub.id]
+            )
+            return
+        if was_online == hub.is_online:
+            return
+        for device_id in self.hub_children.get(hub.id, ()):
+            self._async_mark_dirty(device_id)
+
+    @callback
+    def _async_update_device_metadata(self, device: HomismartDevice) -> None:
+        """Track a device's metadata, writing renames and upgrades to HA."""
+        metadata = _device_metadata(device)
+        registered = self._registered_metadata.get(device.id)
+        if registered == metadata:
+            return
+        self._registered_metadata[device.id] = metadata
+        if registered is None:
+            # The entity registers a new device from its device_info.
+            return
+        revisions = self.metadata_revisions
+        revisions[device.id] = revisions.get(device.id, 0) + 1
+        if registered[:2] == metadata[:2]:
+            return
         dev_reg = dr.async_get(self.hass)
-        dev_reg.async_get_or_create(
-            config_entry_id=self.entry.entry_id,
-            identifiers={(DOMAIN, hub.id)},
-            name=hub.name,
-            manufacturer="HomiSmart",
-            model="Hub",
+        device_entry = dev_reg.async_get_device(identifiers={(DOMAIN, device.id)})
+        if device_entry is None:
+            return
+        name, sw_version = metadata[:2]
+        dev_reg.async_update_device(device_entry.id, name=name, sw_version=sw_version)
+
+    @callback
+    def _handle_session_authenticated(self, username: str) -> None:
+        """Start tracking the resync of the device list sent after login."""
+        if self._authenticated_before:
+            self.counters["reconnects"] += 1
+        self._authenticated_before = True
+        # Hubs are not indexed, so this is every known device.
+        self._resync_remaining = set(self._device_hub)
+        self._resync_started = time.monotonic()
+        self._resync_changed = self._resync_unchanged = 0
+
+    @callback
+    def _async_resync_seen(self, device_id: str, changed: bool) -> None:
+        """Tick off a device during a resync, finishing it with the last one."""
+        self._resync_remaining.discard(device_id)
+        if changed:
+            self._resync_changed += 1
+        else:
+            self._resync_unchanged += 1
+            self.counters["resync_unchanged"] += 1
+        if self._resync_remaining:
+            return
+        resync = {
+            "finished": time.time(),
+            "duration_ms": round((time.monotonic() - self._resync_started) * 1000, 1),
+            "changed": self._resync_changed,
+            "unchanged": self._resync_unchanged,
+        }
+        _LOGGER.debug("HomiSmart resync finished: %s", resync)
+        self.resync_history.append(resync)
+
+    @callback
+    def _async_index_device(self, device: HomismartDevice) -> None:
+        """Keep the hub -> children index in sync with the device's pid."""
+        pid = device.pid
+        old_pid = self._device_hub.get(device.id)
+        if device.id in self._device_hub and old_pid == pid:
+            return
+        if old_pid is not None:
+            self.hub_children.get(old_pid, set()).discard(device.id)
+        self._device_hub[device.id] = pid
+        if pid is not None:
+            self.hub_children.setdefault(pid, set()).add(device.id)
+
+    @callback
+    def _async_mark_dirty(self, device_id: str) -> None:
+        """Mark a device as changed and schedule a coalesced flush."""
+        self._dirty_devices.add(device_id)
+        if self._flush_handle is not None:
+            return
+        if self.update_window > 0:
+            self._flush_handle = self.hass.loop.call_later(
+                self.update_window, self._timed_flush_updates
+            )
+        else:
+            self._flush_handle = self.hass.loop.call_soon(self._timed_flush_updates)
+
+    @callback
+    def async_subscribe_device(
+        self, device_id: str, update_callback: Callable[[], None]
+    ) -> CALLBACK_TYPE:
+        """Call *update_callback* when the device changes; returns an unsubscribe."""
+        listeners = self._device_listeners.setdefault(device_id, [])
+        listeners.append(update_callback)
+
+        @callback
+        def _async_unsubscribe() -> None:
+            listeners.remove(update_callback)
+            if not listeners and self._device_listeners.get(device_id) is listeners:
+                del self._device_listeners[device_id]
+
+        return _async_unsubscribe
+
+    @callback
+    def _async_flush_updates(self) -> None:
+        """Notify the subscribers of each dirty device once."""
+        self._flush_handle = None
+        dirty, self._dirty_devices = self._dirty_devices, set()
+        self.counters["update_signals"] += len(dirty)
+        listeners = self._device_listeners
+        for device_id in dirty:
+            if (callbacks := listeners.get(device_id)) is None:
+                continue
+            # Copy, as a callback may unsubscribe while we iterate.
+            for update_callback in tuple(callbacks):
+                try:
+                    update_callback()
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error updating HomiSmart device %s", device_id)
+
+    async def async_send_command(
+        self, device: HomismartDevice, action: str, *args: Any
+    ) -> bool:
+        """Send a device command, e.g. "turn_on", through its hub's queue.
+
+        Returns False if the command was skipped as redundant.
+        """
+        if self.skip_redundant and self._is_redundant(device, action, args):
+            _LOGGER.debug("Skipping redundant %s for %s", action, device.id)
+            self.counters["commands_skipped"] += 1
+            return False
+        command = getattr(device, action)
+        hub_id = device.pid or device.id
+
+        def _job() -> Awaitable[None]:
+            self._async_await_confirmation(device, hub_id, action, args)
+            return command(*args)
+
+        start = time.monotonic()
+        self._commands_in_flight[device.id] += 1
+        try:
+            await self.scheduler.async_run(hub_id, device.id, _job)
+        finally:
+            self._commands_in_flight[device.id] -= 1
+            if not self._commands_in_flight[device.id]:
+                del self._commands_in_flight[device.id]
+        self.command_latency.add(time.monotonic() - start)
+        return True
+
+    @callback
+    def _async_await_confirmation(
+        self,
+        device: HomismartDevice,
+        hub_id: str,
+        action: str,
+        args: tuple[Any, ...],
+    ) -> None:
+        """Start timing a command until the push that confirms it."""
+        attribute = value = None
+        if (target := COMMAND_TARGET_STATES.get(action)) is not None:
+            attribute, value = target
+            if value is None:
+                value = args[0]
+            if getattr(device, attribute, None) == value:
+                # Already there: the client may not send anything.
+                return
+        if device.id in self._awaiting_confirm:
+            self.counters["confirm_superseded"] += 1
+        self._awaiting_confirm[device.id] = (
+            time.monotonic(),
+            hub_id,
+            _device_type_name(device),
+            attribute,
+            value,
+        )
+        if self._confirm_sweep is None:
+            self._confirm_sweep = self.hass.loop.call_later(
+                COMMAND_CONFIRM_TIMEOUT, self._async_expire_confirmations
+            )
+
+    @callback
+    def _async_check_confirmation(self, device: HomismartDevice) -> None:
+        """Record the latency if this push confirms the device's last command."""
+        sent_at, hub_id, type_name, attribute, value = self._awaiting_confirm[device.id]
+        if attribute is not None and getattr(device, attribute, None) != value:
+            # E.g. a cover reporting the levels it passes through.
+            return
+        del self._awaiting_confirm[device.id]
+        latency = time.monotonic() - sent_at
+        for series, key in (
+            (self.confirm_latency_by_hub, hub_id),
+            (self.confirm_latency_by_type, type_name),
+        ):
+            if (samples := series.get(key)) is None:
+                samples = series[key] = LatencySamples()
+            samples.add(latency)
+
+    @callback
+    def _async_expire_confirmations(self) -> None:
+        """Count commands whose confirming push never came."""
+        self._confirm_sweep = None
+        now = time.monotonic()
+        awaiting = self._awaiting_confirm
+        for device_id, (sent_at, hub_id, *_) in list(awaiting.items()):
+            if now - sent_at >= COMMAND_CONFIRM_TIMEOUT:
+                del awaiting[device_id]
+                self.counters["confirm_timeouts"] += 1
+                self.confirm_timeouts_by_hub[hub_id] += 1
+        if awaiting:
+            oldest = min(entry[0] for entry in awaiting.values())
+            self._confirm_sweep = self.hass.loop.call_later(
+                oldest + COMMAND_CONFIRM_TIMEOUT - now,
+                self._async_expire_confirmations,
+            )
+
+    def _is_redundant(
+        self, device: HomismartDevice, action: str, args: tuple[Any, ...]
+    ) -> bool:
+        """Return True if fresh cached state shows the command is a no-op.
+
+        Never while another command for the device is queued, being sent or
+        awaiting its confirming push: the cached state is about to change.
+        """
+        if device.id in self._awaiting_confirm or self._commands_in_flight[device.id]:
+            return False
+        if (target := COMMAND_TARGET_STATES.get(action)) is None:
+            return False
+        seen = self._state_seen.get(device.id)
+        if seen is None or time.monotonic() - seen > self.state_max_age:
+            return False
+        attribute, value = target
+        if value is None:
+            value = args[0]
+        return getattr(device, attribute, None) == value
+
+    async def async_bulk_command(
+        self, device_ids: list[str], action: str, level: int | None = None
+    ) -> dict[str, str]:
+        """Run one action on many devices at once, through the hub queues.
+
+        Returns a result per device: "ok", "unknown_device", "unsupported"
+        or the error message of a failed command.
+        """
+        method = BULK_ACTIONS[action]
+        args = (level,) if action == "set_level" else ()
+        return await self._async_run_commands(
+            [(device_id, method, args) for device_id in device_ids]
+        )
+
+    async def _async_run_commands(
+        self, commands: list[tuple[str, str, tuple[Any, ...]]]
+    ) -> dict[str, str]:
+        """Run (device ID, method, args) commands concurrently, with results."""
+
+        async def _async_run(device_id: str, method: str, args: tuple[Any, ...]) -> str:
+            device = self.device_registry.get(device_id)
+            if device is None:
+                return "unknown_device"
+            if not hasattr(device, method):
+                return "unsupported"
+            try:
+                await self.async_send_command(device, method, *args)
+            except Exception as exc:  # pylint: disable=broad-except
+                _LOGGER.warning("%s failed for %s: %s", method, device_id, exc)
+                return f"error: {exc}"
+            return "ok"
+
+        results = await asyncio.gather(*(_async_run(*command) for command in commands))
+        return {command[0]: result for command, result in zip(commands, results)}
+
+    @callback
+    def async_create_snapshot(
+        self, name: str, device_ids: list[str] | None = None
+    ) -> int:
+        """Record the on/off state and cover level of devices under *name*.
+
+        Without device IDs every light, switch and cover is recorded; given
+        IDs of hubs or unsupported devices are ignored. Returns the number of
+        devices recorded. When that is none, e.g. for an entry that holds
+        none of the devices, nothing is stored, so the entry keeps any
+        snapshot it already had under *name*.
+        """
+        if device_ids is None:
+            device_ids = [
+                device_id
+                for devices in self.platform_devices.values()
+                for device_id in devices
+            ]
+        lights = self.platform_devices["light"]
+        switches = self.platform_devices["switch"]
+        covers = self.platform_devices["cover"]
+        snapshot: dict[str, dict[str, Any]] = {}
+        for device_id in device_ids:
+            device = self.device_registry.get(device_id)
+            if device is None:
+                continue
+            if device_id in covers:
+                if device.current_level is not None:
+                    snapshot[device_id] = {"level": device.current_level}
+            elif device_id in lights or device_id in switches:
+                snapshot[device_id] = {"is_on": device.is_on}
+        if snapshot:
+            self.snapshots[name] = snapshot
+        return len(snapshot)
+
+    async def async_restore_snapshot(self, name: str) -> dict[str, Any] | None:
+        """Send commands only for devices that differ from snapshot *name*.
+
+        Returns None if there is no such snapshot, otherwise how many
+        commands were sent and skipped, with a result per device sent to.
+        """
+        if (snapshot := self.snapshots.get(name)) is None:
+            return None
+        commands: list[tuple[str, str, tuple[Any, ...]]] = []
+        skipped = 0
+        for device_id, state in snapshot.items():
+            device = self.device_registry.get(device_id)
+            if device is None:
+                continue
+            if "level" in state:
+                if device.current_level == state["level"]:
+                    skipped += 1
+                    continue
+                commands.append((device_id, "set_level", (state["level"],)))
+            else:
+                if device.is_on == state["is_on"]:
+                    skipped += 1
+                    continue
+                commands.append(
+                    (device_id, "turn_on" if state["is_on"] else "turn_off", ())
+                )
+        self.counters["snapshot_commands_skipped"] += skipped
+        results = await self._async_run_commands(commands)
+        return {"sent": len(commands), "skipped": skipped, "results": results}
+
+    async def async_start_capture(self, path: str, duration: float) -> None:
+        """Capture raw session events to *path* for *duration* seconds."""
+        await self.async_stop_capture()
+        self.capture = EventCapture(self.hass, self.client.session, path, duration)
+        self.capture.async_start()
+
+    async def async_stop_capture(self) -> dict[str, Any] | None:
+        """Stop the capture, returning its file and event count, if any."""
+        if (capture := self.capture) is None:
+            return None
+        self.capture = None
+        await capture.async_stop()
+        return {"path": capture.path, "events": capture.events}
+
+    @callback
+    def _async_schedule_topology_save(self) -> None:
+        """Persist the topology after a quiet period, without piling up timers."""
+        if self._topology_save_pending:
+            return
+        self._topology_save_pending = True
+        self._store.async_delay_save(self._topology_snapshot, TOPOLOGY_SAVE_DELAY)
+
+    @callback
+    def _topology_snapshot(self) -> dict[str, Any]:
+        """Return the compact topology written to storage."""
+        self._topology_save_pending = False
+        devices = []
+        for device in self.device_registry.values():
+            raw = device.raw
+            devices.append({key: raw[key] for key in TOPOLOGY_FIELDS if key in raw})
+        return {"devices": devices}
+
+    async def async_restore_topology(self) -> bool:
+        """Create devices and hubs from the cached topology, if there is one.
+
+        The cached entries are fed to the client session as a device list, so
+        the live device list updates the same objects when it arrives.
+        """
+        data = await self._store.async_load()
+        if not data or not data.get("devices"):
+            return False
+        _LOGGER.info(
+            "Restoring %d HomiSmart devices from the cached topology.",
+            len(data["devices"]),
+        )
+        self._async_register_listeners()
+        # The cached state may be days old: it must not count as fresh.
+        self._restoring = True
+        try:
+            self.client.session.dispatch_message(
+                ReceivePrefix.DEVICE_LIST.value, data["devices"]
+            )
+        finally:
+            self._restoring = False
+        return True
+
+    @callback
+    def _async_register_listeners(self) -> None:
+        """Register the coordinator's session event listeners once."""
+        if self._listeners_registered:
+            return
+        self._listeners_registered = True
+        handlers: dict[str, Callable[..., None]] = {
+            "new_device_added": self._handle_new_device,
+            "device_updated": self._async_enqueue_update,
+            "device_deleted": self._handle_device_removed,
+            "new_hub_added": self._handle_new_hub,
+            "hub_updated": self._handle_hub_update,
+            "hub_deleted": self._handle_device_removed,
+            "session_authenticated": self._handle_session_authenticated,
+        }
+        # A hub's online flip fans out to its children.
+        sizes: dict[str, Callable[..., int]] = {
+            "new_hub_added": self._hub_fanout,
+            "hub_updated": self._hub_fanout,
+        }
+        for event, handler in handlers.items():
+            self.client.session.register_event_listener(
+                event, self._timed(event, handler, sizes.get(event, _payload_size))
+            )
+
+    def _hub_fanout(self, hub: HomismartDevice) -> int:
+        """Return the number of children a hub update can touch."""
+        return len(self.hub_children.get(hub.id, ()))
+
+    def _timed(
+        self,
+        name: str,
+        handler: Callable[..., None],
+        size: Callable[..., int] = _payload_size,
+    ) -> Callable[..., None]:
+        """Wrap a callback to time it against the budget.
+
+        *size* returns the number of items a call handles, from its arguments;
+        it runs before the handler, which may consume them.
+        """
+
+        @callback
+        def _async_timed(*args: Any) -> None:
+            items = size(*args)
+            start = time.perf_counter()
+            try:
+                handler(*args)
+            finally:
+                self.async_record_callback_time(
+                    name, time.perf_counter() - start, items
+                )
+
+        return _async_timed
+
+    @callback
+    def async_record_callback_time(
+        self, name: str, elapsed: float, size: int = 1
+    ) -> None:
+        """Account for one call of *size* items; log it, rate limited, if slow."""
+        self.callback_calls[name] += 1
+        self.callback_time[name] += elapsed
+        if elapsed > self.callback_max[name]:
+            self.callback_max[name] = elapsed
+        if elapsed <= self.callback_budget:
+            return
+        self.callback_over_budget[name] += 1
+        now = time.monotonic()
+        last_logged = self._slow_logged.get(name)
+        if last_logged is not None and now - last_logged < SLOW_CALLBACK_LOG_INTERVAL:
+            return
+        self._slow_logged[name] = now
+        _LOGGER.warning(
+            "HomiSmart %s took %.1f ms, over the %.1f ms budget "
+            "(payload of %d items, %d slow calls so far)",
+            name,
+            elapsed * 1000,
+            self.callback_budget * 1000,
+            size,
+            self.callback_over_budget[name],
         )
-        # Notify all entities so they can re-evaluate availability.
-        for device_id in self.device_registry:
-            async_dispatcher_send(self.hass, f"{SIGNAL_UPDATE_DEVICE}_{device_id}")
 
     async def connect(self) -> None:
         """Connect to the HomiSmart WebSocket and start listening for events."""
         _LOGGER.info("Starting HomiSmart client connection.")
         # Register event listeners before connecting.
-        self.client.session.register_event_listener(
-            "new_device_added", self._handle_new_device
-        )
-        self.client.session.register_event_listener(
-            "device_updated", self._handle_device_update
-        )
-        self.client.session.register_event_listener(
-            "new_hub_added", self._handle_hub_update
-        )
-        self.client.session.register_event_listener(
-            "hub_updated", self._handle_hub_update
-        )
+        self._async_register_listeners()
 
         # connect() returns after successful login. The library manages
         # the receive loop, heartbeat, and reconnection internally.
         await self.client.connect(timeout=30)
 
+    @callback
+    def async_start_background_connect(self) -> None:
+        """Connect in a background task; entities stay unavailable until then."""
+        self._connect_task = self.entry.async_create_background_task(
+            self.hass, self._async_connect_with_backoff(), "homismart_connect"
+        )
+
+    async def _async_connect_with_backoff(self) -> None:
+        """Retry the initial connection with jittered exponential backoff.
+
+        Once logged in, the client library handles reconnections itself.
+        """
+        attempt = 0
+        while True:
+            try:
+                await self.connect()
+            except Exception as exc:  # pylint: disable=broad-except
+                delay = min(
+                    CONNECT_RETRY_BASE_DELAY * 2**attempt, CONNECT_RETRY_MAX_DELAY
+                )
+                delay += random.uniform(0, delay * 0.25)
+                attempt += 1
+                self.counters["connect_failures"] += 1
+                _LOGGER.warning(
+                    "Failed to connect to HomiSmart (%s), retrying in %.0f s",
+                    exc,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+            else:
+                _LOGGER.info("Connected to HomiSmart after %d retries.", attempt)
+                return
+
     async def disconnect(self) -> None:
         """Disconnect the HomiSmart client and clean up."""
         _LOGGER.info("Disconnecting HomiSmart client.")
+        if self._connect_task is not None and not self._connect_task.done():
+            self._connect_task.cancel()
+            try:
+                await self._connect_task
+            except asyncio.CancelledError:
+                pass
+        self._connect_task = None
+        for handle in (
+            self._flush_handle,
+            self._new_device_handle,
+            self._ingest_handle,
+            self._confirm_sweep,
+        ):
+            if handle is not None:
+                handle.cancel()
+        self._flush_handle = self._new_device_handle = self._ingest_handle = None
+        self._confirm_sweep = None
+        self._ingest_pending.clear()
+        await self.async_stop_capture()
+        # Write the last known state, which pushes alone do not save.
+        if self.device_registry:
+            await self._store.async_save(self._topology_snapshot())
         await self.client.disconnect()
@@ -1,6 +1,7 @@
 """Cover platform for the HomiSmart integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Any
 
@@ -33,22 +34,31 @@ async def async_setup_entry(
     """Set up the HomiSmart cover platform."""
     coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
 
-    # Callback to add a new cover entity.
+    # Devices that already have an entity, in case a device is announced
+    # both by the initial scan and by a pending discovery batch.
+    known_ids: set[str] = set()
+
+    # Callback to add a batch of new cover entities.
     @callback
-    def async_add_cover(device: CurtainDevice) -> None:
-        """Add a new HomiSmart cover entity."""
-        _LOGGER.info("Adding new cover: %s", device.name)
-        async_add_entities([HomiSmartCover(coordinator, device)])
+    def async_add_covers(devices: list[CurtainDevice]) -> None:
+        """Add new HomiSmart cover entities."""
+        entities = []
+        for device in devices:
+            if device.id in known_ids:
+                continue
+            known_ids.add(device.id)
+            _LOGGER.info("Adding new cover: %s", device.name)
+            entities.append(HomiSmartCover(coordinator, device))
+        if entities:
+            async_add_entities(entities)
 
     # Register a listener for new cover devices.
     entry.async_on_unload(
-        async_dispatcher_connect(hass, SIGNAL_NEW_COVER, async_add_cover)
+        async_dispatcher_connect(hass, SIGNAL_NEW_COVER, async_add_covers)
     )
 
     # Add any covers that are already known by the coordinator.
-    for device in coordinator.device_registry.values():
-        if isinstance(device, CurtainDevice):
-            async_add_cover(device)
+    async_add_covers(list(coordinator.platform_devices["cover"].values()))
 
 
 class HomiSmartCover(HomiSmartEntity, CoverEntity):
@@ -73,32 +83,116 @@ class HomiSmartCover(HomiSmartEntity, CoverEntity):
         self.device: CurtainDevice = device
         if device.device_type_enum == DeviceType.SHUTTER:
             self._attr_device_class = CoverDeviceClass.SHUTTER
+        # Latest-wins gate for position commands: closed while a command is
+        # in flight and for the settle time after it.
+        self._pending_position: int | None = None
+        self._position_gate_busy = False
+        self._position_gate: asyncio.TimerHandle | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Register a callback for when the entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._async_cancel_position_gate)
 
     @property
     def current_cover_position(self) -> int | None:
         """Return the current position of the cover (0-100)."""
+        if self._optimistic_value is not None:
+            return self._optimistic_value
         return self.device.current_level
 
     @property
     def is_closed(self) -> bool | None:
         """Return true if the cover is closed, None if position is unknown."""
-        if self.device.current_level is None:
+        position = self.current_cover_position
+        if position is None:
             return None
-        return self.device.current_level == 100
+        return position == 100
+
+    def _projected_state(self) -> tuple[Any, ...]:
+        """Return the parts of the entity state that Home Assistant exposes."""
+        return (*super()._projected_state(), self.current_cover_position)
+
+    def _optimistic_confirmation(self, expected: int) -> bool | None:
+        """Return True once the cover reports the target position.
+
+        Other positions are not a contradiction: a moving cover reports the
+        levels it passes through.
+        """
+        return True if self.device.current_level == expected else None
 
     async def async_open_cover(self, **kwargs: Any) -> None:
         """Open the cover."""
-        await self.device.open_fully()
+        self._pending_position = None
+        await self._async_optimistic_command(
+            0, self.coordinator.async_send_command(self.device, "open_fully")
+        )
 
     async def async_close_cover(self, **kwargs: Any) -> None:
         """Close the cover."""
-        await self.device.close_fully()
+        self._pending_position = None
+        await self._async_optimistic_command(
+            100, self.coordinator.async_send_command(self.device, "close_fully")
+        )
 
     async def async_set_cover_position(self, **kwargs: Any) -> None:
         """Move the cover to a specific position."""
         position = kwargs[ATTR_POSITION]
-        await self.device.set_level(position)
+        await self._async_optimistic_command(
+            position, self._async_send_position(position)
+        )
+
+    async def _async_send_position(self, position: int) -> None:
+        """Send a position through the latest-wins gate.
+
+        While a position command is in flight or settling, newer targets
+        replace the pending one and return at once; only the latest is sent,
+        in the background, when the gate opens. The caller whose position is
+        sent returns once it is sent, without waiting for the settle time.
+        """
+        if self._pending_position is not None:
+            self.coordinator.counters["cover_positions_superseded"] += 1
+        self._pending_position = position
+        if self._position_gate_busy:
+            return
+        await self._async_send_pending_position()
+
+    async def _async_send_pending_position(self) -> None:
+        """Send the pending position, then hold the gate for the settle time."""
+        self._position_gate_busy = True
+        position, self._pending_position = self._pending_position, None
+        try:
+            await self.coordinator.async_send_command(
+                self.device, "set_level", position
+            )
+        finally:
+            self._position_gate = self.coordinator.hass.loop.call_later(
+                self.coordinator.cover_settle_time, self._async_open_position_gate
+            )
+
+    @callback
+    def _async_open_position_gate(self) -> None:
+        """Open the gate, sending the position requested meanwhile, if any."""
+        self._position_gate = None
+        self._position_gate_busy = False
+        if self._pending_position is not None:
+            self.coordinator.hass.async_create_task(
+                self._async_send_pending_position()
+            )
+
+    @callback
+    def _async_cancel_position_gate(self) -> None:
+        """Drop the pending position and stop holding the gate."""
+        self._pending_position = None
+        if self._position_gate is not None:
+            self._position_gate.cancel()
+            self._position_gate = None
+        self._position_gate_busy = False
 
     async def async_stop_cover(self, **kwargs: Any) -> None:
         """Stop the cover's movement."""
-        await self.device.stop()
+        self._pending_position = None
+        if self._optimistic_value is not None:
+            self._async_clear_optimistic()
+            self._async_write_if_changed()
+        await self.coordinator.async_send_command(self.device, "stop")
@@ -0,0 +1,87 @@
+"""Diagnostics support for the HomiSmart integration."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import HomiSmartCoordinator
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry, from the coordinator's counters."""
+    coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
+    counters = coordinator.counters
+    uptime = max(time.monotonic() - coordinator.started, 1e-9)
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "devices": coordinator.async_device_counts(),
+        "events": {
+            "uptime_s": round(uptime),
+            "counts": dict(coordinator.event_counts),
+            "per_minute": {
+                event: round(count * 60 / uptime, 2)
+                for event, count in coordinator.event_counts.items()
+            },
+        },
+        "state_writes": {
+            "written": counters["state_writes"],
+            "suppressed": counters["state_writes_suppressed"],
+            "update_signals": counters["update_signals"],
+        },
+        "commands": {
+            "latency": coordinator.command_latency.summary(),
+            "skipped": counters["commands_skipped"],
+            "hub_queues": coordinator.scheduler.stats(),
+        },
+        "confirmations": {
+            "by_hub": {
+                hub_id: samples.summary()
+                for hub_id, samples in coordinator.confirm_latency_by_hub.items()
+            },
+            "by_type": {
+                type_name: samples.summary()
+                for type_name, samples in coordinator.confirm_latency_by_type.items()
+            },
+            "timeouts": dict(coordinator.confirm_timeouts_by_hub),
+            "superseded": counters["confirm_superseded"],
+        },
+        "connection": {
+            "connected": coordinator.client.is_connected,
+            "reconnects": counters["reconnects"],
+            "connect_failures": counters["connect_failures"],
+            "resync_history": list(coordinator.resync_history),
+        },
+        "callbacks": {
+            "budget_ms": round(coordinator.callback_budget * 1000, 1),
+            **{
+                name: {
+                    "calls": calls,
+                    "total_ms": round(coordinator.callback_time[name] * 1000, 1),
+                    "max_ms": round(coordinator.callback_max[name] * 1000, 1),
+                    "over_budget": coordinator.callback_over_budget[name],
+                }
+                for name, calls in coordinator.callback_calls.items()
+            },
+        },
+        "ingest": {
+            "high_water": coordinator.ingest_high_water,
+            "superseded": counters["ingest_superseded"],
+            "overflow": counters["ingest_overflow"],
+        },
+        "counters": dict(counters),
+        "recent_events": async_redact_data(coordinator.async_dump_events(), TO_REDACT),
+    }
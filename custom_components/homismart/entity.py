@@ -1,14 +1,21 @@
 """Base entity for the HomiSmart integration."""
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Awaitable
+import logging
+import time
+from typing import Any
+
 from homismart_client.devices import HomismartDevice
 
 from homeassistant.core import callback
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo, Entity
 
 from .const import DOMAIN
-from .coordinator import SIGNAL_UPDATE_DEVICE, HomiSmartCoordinator
+from .coordinator import HomiSmartCoordinator
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class HomiSmartEntity(Entity):
@@ -25,10 +32,24 @@ class HomiSmartEntity(Entity):
         self.coordinator = coordinator
         self.device = device
         self._attr_unique_id = self.device.id
+        # Projected state as of the last write, used to skip no-op writes.
+        self._last_written_state: tuple[Any, ...] | None = None
+        # Expected state shown while an optimistic command awaits its push.
+        self._optimistic_value: Any = None
+        self._optimistic_expiry: asyncio.TimerHandle | None = None
+        # (metadata revision, DeviceInfo) the cached device info was built at.
+        self._device_info: tuple[int, DeviceInfo] | None = None
 
     @property
     def device_info(self) -> DeviceInfo:
-        """Return device information for the device registry."""
+        """Return device information, rebuilt only when the metadata changed."""
+        revision = self.coordinator.metadata_revisions.get(self.device.id, 0)
+        if self._device_info is None or self._device_info[0] != revision:
+            self._device_info = (revision, self._build_device_info())
+        return self._device_info[1]
+
+    def _build_device_info(self) -> DeviceInfo:
+        """Build device information for the device registry."""
         # Use the hub/parent ID to group related entities under one device.
         via_device = (DOMAIN, self.device.pid) if self.device.pid else None
 
@@ -54,14 +75,109 @@ class HomiSmartEntity(Entity):
     async def async_added_to_hass(self) -> None:
         """Register a callback for when the entity is added to hass."""
         await super().async_added_to_hass()
-        # Register a listener for updates specific to this entity's ID.
+        # Subscribe to updates for this entity's device.
         self.async_on_remove(
-            async_dispatcher_connect(
-                self.hass, f"{SIGNAL_UPDATE_DEVICE}_{self.device.id}", self._update_callback
+            self.coordinator.async_subscribe_device(
+                self.device.id, self._update_callback
             )
         )
+        self.async_on_remove(self._async_clear_optimistic)
+        # Home Assistant writes the initial state right after this returns.
+        self._last_written_state = self._projected_state()
+
+    def _projected_state(self) -> tuple[Any, ...]:
+        """Return the parts of the entity state that Home Assistant exposes."""
+        return (self.available,)
 
     @callback
     def _update_callback(self) -> None:
-        """Handle received data from the dispatcher and update the entity's state."""
+        """Handle an update of the device and update the entity's state."""
+        if self._optimistic_value is not None:
+            confirmed = self._optimistic_confirmation(self._optimistic_value)
+            if confirmed:
+                self._async_clear_optimistic()
+            elif confirmed is False:
+                _LOGGER.warning(
+                    "%s: device reported a state contradicting %s, rolling back",
+                    self.entity_id,
+                    self._optimistic_value,
+                )
+                self._async_clear_optimistic()
+                self.coordinator.counters["optimistic_rollbacks"] += 1
+        self._async_write_if_changed()
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """Write the entity state unless its projected state is unchanged."""
+        state = self._projected_state()
+        if state == self._last_written_state:
+            # Heartbeats and echoes that change nothing visible.
+            self.coordinator.counters["state_writes_suppressed"] += 1
+            return
+        self._last_written_state = state
+        self.coordinator.counters["state_writes"] += 1
+        start = time.perf_counter()
         self.async_write_ha_state()
+        self.coordinator.async_record_callback_time(
+            "state_write", time.perf_counter() - start
+        )
+
+    def _optimistic_confirmation(self, expected: Any) -> bool | None:
+        """Return whether the device reports *expected*, or None if undecided.
+
+        Undecided by default: the optimistic state then lasts until it expires.
+        """
+        return None
+
+    async def _async_optimistic_command(
+        self, expected: Any, command: Awaitable[Any]
+    ) -> None:
+        """Await *command*, showing *expected* until the device confirms it.
+
+        Without the optimistic option the command is simply awaited.
+        """
+        if not self.coordinator.optimistic:
+            await command
+            return
+
+        self._async_clear_optimistic()
+        self._optimistic_value = expected
+        self._optimistic_expiry = self.hass.loop.call_later(
+            self.coordinator.optimistic_timeout, self._async_optimistic_expired
+        )
+        self._async_write_if_changed()
+        try:
+            await command
+        except Exception:
+            self._async_clear_optimistic()
+            self._async_write_if_changed()
+            raise
+        # The device may already be in the expected state, e.g. when the
+        # command was skipped as redundant, so no confirming push will come.
+        if self._optimistic_value is not None and self._optimistic_confirmation(
+            self._optimistic_value
+        ):
+            self._async_clear_optimistic()
+            self._async_write_if_changed()
+
+    @callback
+    def _async_optimistic_expired(self) -> None:
+        """Roll back an optimistic state the device never confirmed."""
+        self._optimistic_expiry = None
+        _LOGGER.warning(
+            "%s: device did not confirm %s within %s s, rolling back",
+            self.entity_id,
+            self._optimistic_value,
+            self.coordinator.optimistic_timeout,
+        )
+        self.coordinator.counters["optimistic_rollbacks"] += 1
+        self._async_clear_optimistic()
+        self._async_write_if_changed()
+
+    @callback
+    def _async_clear_optimistic(self) -> None:
+        """Drop the optimistic state and its confirmation deadline."""
+        self._optimistic_value = None
+        if self._optimistic_expiry is not None:
+            self._optimistic_expiry.cancel()
+            self._optimistic_expiry = None
@@ -2,9 +2,9 @@
 from __future__ import annotations
 
 import logging
+from typing import Any
 
 from homismart_client.devices import SwitchableDevice
-from homismart_client.enums import DeviceType
 
 from homeassistant.components.light import ColorMode, LightEntity
 from homeassistant.config_entries import ConfigEntry
@@ -27,23 +27,31 @@ async def async_setup_entry(
     """Set up the HomiSmart light platform."""
     coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
 
-    # Callback to add a new light entity.
+    # Devices that already have an entity, in case a device is announced
+    # both by the initial scan and by a pending discovery batch.
+    known_ids: set[str] = set()
+
+    # Callback to add a batch of new light entities.
     @callback
-    def async_add_light(device: SwitchableDevice) -> None:
-        """Add a new HomiSmart light entity."""
-        if device.device_type_enum == DeviceType.SWITCH:
+    def async_add_lights(devices: list[SwitchableDevice]) -> None:
+        """Add new HomiSmart light entities."""
+        entities = []
+        for device in devices:
+            if device.id in known_ids:
+                continue
+            known_ids.add(device.id)
             _LOGGER.info("Adding new light: %s", device.name)
-            async_add_entities([HomiSmartLight(coordinator, device)])
+            entities.append(HomiSmartLight(coordinator, device))
+        if entities:
+            async_add_entities(entities)
 
     # Register a listener for new light devices.
     entry.async_on_unload(
-        async_dispatcher_connect(hass, SIGNAL_NEW_LIGHT, async_add_light)
+        async_dispatcher_connect(hass, SIGNAL_NEW_LIGHT, async_add_lights)
     )
 
     # Add any lights that are already known by the coordinator.
-    for device in coordinator.device_registry.values():
-        if isinstance(device, SwitchableDevice) and device.device_type_enum == DeviceType.SWITCH:
-            async_add_light(device)
+    async_add_lights(list(coordinator.platform_devices["light"].values()))
 
 
 class HomiSmartLight(HomiSmartEntity, LightEntity):
@@ -64,16 +72,32 @@ class HomiSmartLight(HomiSmartEntity, LightEntity):
     @property
     def is_on(self) -> bool:
         """Return true if the light is on."""
+        if self._optimistic_value is not None:
+            return self._optimistic_value
         return self.device.is_on
 
+    def _projected_state(self) -> tuple[Any, ...]:
+        """Return the parts of the entity state that Home Assistant exposes."""
+        return (*super()._projected_state(), self.is_on)
+
+    def _optimistic_confirmation(self, expected: bool) -> bool:
+        """Return whether the device reports the expected on/off state."""
+        return self.device.is_on == expected
+
     async def async_turn_on(self, **kwargs) -> None:
         """Turn the light on."""
-        await self.device.turn_on()
+        await self._async_optimistic_command(
+            True, self.coordinator.async_send_command(self.device, "turn_on")
+        )
 
     async def async_turn_off(self, **kwargs) -> None:
         """Turn the light off."""
-        await self.device.turn_off()
+        await self._async_optimistic_command(
+            False, self.coordinator.async_send_command(self.device, "turn_off")
+        )
 
     async def async_toggle(self, **kwargs) -> None:
         """Toggle the light state."""
-        await self.device.toggle()
+        await self._async_optimistic_command(
+            not self.is_on, self.coordinator.async_send_command(self.device, "toggle")
+        )
@@ -0,0 +1,100 @@
+"""Per-hub command scheduler for the HomiSmart integration."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+import time
+from typing import Any, TypeVar
+
+_T = TypeVar("_T")
+
+
+@dataclass
+class HubQueueStats:
+    """Queue depth and wait-time figures for one hub."""
+
+    depth: int = 0
+    max_depth: int = 0
+    commands: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the figures with wait times in milliseconds."""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "commands": self.commands,
+            "avg_wait_ms": round(self.total_wait / self.commands * 1000, 1)
+            if self.commands
+            else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class _HubQueue:
+    """Scheduling state for the commands of one hub."""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.next_start = 0.0
+        self.device_locks: dict[str, asyncio.Lock] = {}
+        self.stats = HubQueueStats()
+
+
+class CommandScheduler:
+    """Queue device commands per hub with bounded concurrency and spacing.
+
+    Commands for one device run one at a time in FIFO order. Each hub
+    starts at most ``max_concurrency`` commands at once, at least
+    ``min_interval`` seconds apart. A device with a burst of commands only
+    holds one place in its hub's queue at a time, so other devices keep
+    their turn.
+    """
+
+    def __init__(self, max_concurrency: int, min_interval: float) -> None:
+        """Initialize the scheduler."""
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self._hubs: dict[str, _HubQueue] = {}
+
+    async def async_run(
+        self, hub_id: str, device_id: str, job: Callable[[], Awaitable[_T]]
+    ) -> _T:
+        """Run *job* for a device once its hub has a free, spaced slot."""
+        hub = self._hubs.get(hub_id)
+        if hub is None:
+            hub = self._hubs[hub_id] = _HubQueue(self.max_concurrency)
+        stats = hub.stats
+        stats.depth += 1
+        stats.max_depth = max(stats.max_depth, stats.depth)
+        queued_at = time.monotonic()
+        started = False
+
+        device_lock = hub.device_locks.get(device_id)
+        if device_lock is None:
+            device_lock = hub.device_locks[device_id] = asyncio.Lock()
+
+        try:
+            async with device_lock, hub.slots:
+                now = time.monotonic()
+                start = max(now, hub.next_start)
+                hub.next_start = start + self.min_interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+
+                started = True
+                stats.depth -= 1
+                wait = time.monotonic() - queued_at
+                stats.commands += 1
+                stats.total_wait += wait
+                stats.max_wait = max(stats.max_wait, wait)
+                return await job()
+        finally:
+            if not started:
+                stats.depth -= 1
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return queue figures per hub."""
+        return {hub_id: hub.stats.as_dict() for hub_id, hub in self._hubs.items()}
@@ -0,0 +1,122 @@
+"""Diagnostic command latency sensors for the HomiSmart integration."""
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN, SIGNAL_NEW_HUB
+from .coordinator import HomiSmartCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Latency figures are summarized from rolling samples, so poll them.
+SCAN_INTERVAL = timedelta(seconds=30)
+
+# Statistic -> (entity name, key in LatencySamples.summary()).
+LATENCY_STATISTICS: dict[str, tuple[str, str]] = {
+    "p50": ("Command latency p50", "p50_ms"),
+    "p95": ("Command latency p95", "p95_ms"),
+    "max": ("Command latency max", "max_ms"),
+}
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the HomiSmart latency sensors, one set per hub."""
+    coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
+
+    known_ids: set[str] = set()
+
+    @callback
+    def async_add_hub_sensors(hub_ids: list[str]) -> None:
+        """Add latency sensors for new hubs."""
+        entities: list[SensorEntity] = []
+        for hub_id in hub_ids:
+            if hub_id in known_ids:
+                continue
+            known_ids.add(hub_id)
+            _LOGGER.info("Adding latency sensors for hub: %s", hub_id)
+            entities.extend(
+                HomiSmartLatencySensor(coordinator, hub_id, statistic)
+                for statistic in LATENCY_STATISTICS
+            )
+            entities.append(HomiSmartTimeoutSensor(coordinator, hub_id))
+        if entities:
+            async_add_entities(entities)
+
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_NEW_HUB.format(entry.entry_id), async_add_hub_sensors
+        )
+    )
+
+    async_add_hub_sensors(coordinator.hub_ids)
+
+
+class HomiSmartHubSensor(SensorEntity):
+    """Base for the diagnostic sensors attached to a hub."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: HomiSmartCoordinator, hub_id: str) -> None:
+        """Initialize the sensor."""
+        self.coordinator = coordinator
+        self.hub_id = hub_id
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, hub_id)})
+
+
+class HomiSmartLatencySensor(HomiSmartHubSensor):
+    """Command -> confirming push latency of a hub, in milliseconds."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(
+        self, coordinator: HomiSmartCoordinator, hub_id: str, statistic: str
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, hub_id)
+        self._attr_name, self._summary_key = LATENCY_STATISTICS[statistic]
+        self._attr_unique_id = f"{hub_id}_command_latency_{statistic}"
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the statistic, or None before the first confirmed command."""
+        samples = self.coordinator.confirm_latency_by_hub.get(self.hub_id)
+        if samples is None:
+            return None
+        return samples.summary().get(self._summary_key)
+
+
+class HomiSmartTimeoutSensor(HomiSmartHubSensor):
+    """Commands of a hub that were never confirmed by a push."""
+
+    _attr_name = "Command timeouts"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, coordinator: HomiSmartCoordinator, hub_id: str) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, hub_id)
+        self._attr_unique_id = f"{hub_id}_command_timeouts"
+
+    @property
+    def native_value(self) -> int:
+        """Return the number of timed out commands."""
+        return self.coordinator.confirm_timeouts_by_hub[self.hub_id]
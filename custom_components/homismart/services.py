@@ -0,0 +1,283 @@
+"""Services for the HomiSmart integration."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_DEVICE_ID, ATTR_ENTITY_ID
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+
+from .const import CAPTURE_DEFAULT_DURATION, CAPTURE_MAX_DURATION, DOMAIN
+from .coordinator import BULK_ACTIONS, HomiSmartCoordinator
+
+SERVICE_BULK_COMMAND = "bulk_command"
+SERVICE_CREATE_SNAPSHOT = "create_snapshot"
+SERVICE_RESTORE_SNAPSHOT = "restore_snapshot"
+SERVICE_DUMP_EVENTS = "dump_events"
+SERVICE_START_CAPTURE = "start_capture"
+SERVICE_STOP_CAPTURE = "stop_capture"
+
+ATTR_ACTION = "action"
+ATTR_DURATION = "duration"
+ATTR_LEVEL = "level"
+ATTR_NAME = "name"
+
+
+def _level_for_set_level(data: dict[str, Any]) -> dict[str, Any]:
+    """Require a level when the action is set_level."""
+    if data[ATTR_ACTION] == "set_level" and data.get(ATTR_LEVEL) is None:
+        raise vol.Invalid("level is required for set_level")
+    return data
+
+
+BULK_COMMAND_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ENTITY_ID, default=[]): cv.entity_ids,
+            vol.Optional(ATTR_DEVICE_ID, default=[]): vol.All(
+                cv.ensure_list, [cv.string]
+            ),
+            vol.Required(ATTR_ACTION): vol.In(list(BULK_ACTIONS)),
+            vol.Optional(ATTR_LEVEL): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=100)
+            ),
+        }
+    ),
+    _level_for_set_level,
+)
+
+CREATE_SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_NAME): cv.string,
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+RESTORE_SNAPSHOT_SCHEMA = vol.Schema({vol.Required(ATTR_NAME): cv.string})
+
+DUMP_EVENTS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+START_CAPTURE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=CAPTURE_DEFAULT_DURATION): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=CAPTURE_MAX_DURATION)
+        ),
+    }
+)
+
+
+@callback
+def async_resolve_device_ids(hass: HomeAssistant, call: ServiceCall) -> list[str]:
+    """Map a call's entity and device IDs to HomiSmart device IDs.
+
+    Device IDs may be Home Assistant device registry IDs or HomiSmart IDs.
+    """
+    ent_reg = er.async_get(hass)
+    dev_reg = dr.async_get(hass)
+    device_ids: list[str] = []
+
+    for entity_id in call.data.get(ATTR_ENTITY_ID, []):
+        entity = ent_reg.async_get(entity_id)
+        if entity is not None and entity.platform == DOMAIN:
+            device_ids.append(entity.unique_id)
+        else:
+            device_ids.append(entity_id)
+
+    for device_id in call.data.get(ATTR_DEVICE_ID, []):
+        device = dev_reg.async_get(device_id)
+        identifiers = device.identifiers if device is not None else ()
+        device_ids.extend(
+            [ident for domain, ident in identifiers if domain == DOMAIN] or [device_id]
+        )
+
+    # Keep the caller's order, without duplicates.
+    return list(dict.fromkeys(device_ids))
+
+
+@callback
+def async_group_by_coordinator(
+    hass: HomeAssistant, device_ids: list[str]
+) -> tuple[dict[HomiSmartCoordinator, list[str]], list[str]]:
+    """Split device IDs by the coordinator that owns them.
+
+    Returns the grouped IDs and the IDs no coordinator knows.
+    """
+    coordinators: list[HomiSmartCoordinator] = list(hass.data.get(DOMAIN, {}).values())
+    grouped: dict[HomiSmartCoordinator, list[str]] = {}
+    unknown: list[str] = []
+    for device_id in device_ids:
+        for coordinator in coordinators:
+            if device_id in coordinator.device_registry:
+                grouped.setdefault(coordinator, []).append(device_id)
+                break
+        else:
+            unknown.append(device_id)
+    return grouped, unknown
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the HomiSmart services once for all config entries."""
+    if hass.services.has_service(DOMAIN, SERVICE_BULK_COMMAND):
+        return
+
+    async def _async_bulk_command(call: ServiceCall) -> ServiceResponse:
+        """Send one action to many devices, concurrently per hub queue."""
+        grouped, unknown = async_group_by_coordinator(
+            hass, async_resolve_device_ids(hass, call)
+        )
+        results: dict[str, str] = dict.fromkeys(unknown, "unknown_device")
+        for coordinator_results in await asyncio.gather(
+            *(
+                coordinator.async_bulk_command(
+                    device_ids, call.data[ATTR_ACTION], call.data.get(ATTR_LEVEL)
+                )
+                for coordinator, device_ids in grouped.items()
+            )
+        ):
+            results.update(coordinator_results)
+        return {"results": results}
+
+    async def _async_create_snapshot(call: ServiceCall) -> ServiceResponse:
+        """Record the current state of devices under a name."""
+        coordinators = list(hass.data.get(DOMAIN, {}).values())
+        name = call.data[ATTR_NAME]
+        if ATTR_ENTITY_ID in call.data or ATTR_DEVICE_ID in call.data:
+            grouped, _ = async_group_by_coordinator(
+                hass, async_resolve_device_ids(hass, call)
+            )
+            recorded = sum(
+                coordinator.async_create_snapshot(name, grouped.get(coordinator, []))
+                for coordinator in coordinators
+            )
+        else:
+            recorded = sum(
+                coordinator.async_create_snapshot(name) for coordinator in coordinators
+            )
+        return {"recorded": recorded}
+
+    async def _async_restore_snapshot(call: ServiceCall) -> ServiceResponse:
+        """Restore a snapshot, sending commands only for changed devices."""
+        name = call.data[ATTR_NAME]
+        summary: dict[str, Any] = {"sent": 0, "skipped": 0, "results": {}}
+        found = False
+        for restored in await asyncio.gather(
+            *(
+                coordinator.async_restore_snapshot(name)
+                for coordinator in hass.data.get(DOMAIN, {}).values()
+            )
+        ):
+            if restored is None:
+                continue
+            found = True
+            summary["sent"] += restored["sent"]
+            summary["skipped"] += restored["skipped"]
+            summary["results"].update(restored["results"])
+        if not found:
+            raise HomeAssistantError(f"Unknown HomiSmart snapshot: {name}")
+        return summary
+
+    async def _async_dump_events(call: ServiceCall) -> ServiceResponse:
+        """Return the recent raw session events, oldest first."""
+        device_ids = async_resolve_device_ids(hass, call) or None
+        events: list[dict[str, Any]] = []
+        for coordinator in hass.data.get(DOMAIN, {}).values():
+            events.extend(coordinator.async_dump_events(device_ids))
+        events.sort(key=lambda event: event["time"])
+        return {"events": events}
+
+    async def _async_start_capture(call: ServiceCall) -> ServiceResponse:
+        """Capture every entry's raw session events to a file in the config dir."""
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        paths: list[str] = []
+        for entry_id, coordinator in hass.data.get(DOMAIN, {}).items():
+            path = hass.config.path(f"homismart_capture_{entry_id}_{stamp}.jsonl")
+            await coordinator.async_start_capture(path, call.data[ATTR_DURATION])
+            paths.append(path)
+        return {"paths": paths}
+
+    async def _async_stop_capture(call: ServiceCall) -> ServiceResponse:
+        """Stop the captures and return their files and event counts."""
+        captures = [
+            capture
+            for coordinator in hass.data.get(DOMAIN, {}).values()
+            if (capture := await coordinator.async_stop_capture()) is not None
+        ]
+        return {"captures": captures}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BULK_COMMAND,
+        _async_bulk_command,
+        schema=BULK_COMMAND_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CREATE_SNAPSHOT,
+        _async_create_snapshot,
+        schema=CREATE_SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESTORE_SNAPSHOT,
+        _async_restore_snapshot,
+        schema=RESTORE_SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DUMP_EVENTS,
+        _async_dump_events,
+        schema=DUMP_EVENTS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_START_CAPTURE,
+        _async_start_capture,
+        schema=START_CAPTURE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_STOP_CAPTURE,
+        _async_stop_capture,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+@callback
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the HomiSmart services once the last entry is unloaded."""
+    if hass.data.get(DOMAIN):
+        return
+    for service in (
+        SERVICE_BULK_COMMAND,
+        SERVICE_CREATE_SNAPSHOT,
+        SERVICE_RESTORE_SNAPSHOT,
+        SERVICE_DUMP_EVENTS,
+        SERVICE_START_CAPTURE,
+        SERVICE_STOP_CAPTURE,
+    ):
+        hass.services.async_remove(DOMAIN, service)
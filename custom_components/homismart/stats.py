@@ -0,0 +1,51 @@
+"""Cheap running statistics for the HomiSmart integration."""
+from __future__ import annotations
+
+from collections import deque
+import math
+from typing import Any
+
+# Latency samples kept per series; percentiles cover the most recent ones.
+LATENCY_SAMPLES = 512
+
+
+def _nearest_rank(ordered: list[float], percent: float) -> float:
+    """Return the nearest-rank percentile of sorted, non-empty samples."""
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class LatencySamples:
+    """Recent latency samples of one series, summarized on demand."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES) -> None:
+        """Initialize the series."""
+        self._samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Record one sample."""
+        self._samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float | None:
+        """Return a nearest-rank percentile of the recent samples, in seconds."""
+        if not self._samples:
+            return None
+        return _nearest_rank(sorted(self._samples), percent)
+
+    def summary(self) -> dict[str, Any]:
+        """Return the count, p50, p95, p99 and max, in milliseconds."""
+        if not self._samples:
+            return {"count": self.count}
+        ordered = sorted(self._samples)
+        return {
+            "count": self.count,
+            "p50_ms": round(_nearest_rank(ordered, 50) * 1000, 1),
+            "p95_ms": round(_nearest_rank(ordered, 95) * 1000, 1),
+            "p99_ms": round(_nearest_rank(ordered, 99) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
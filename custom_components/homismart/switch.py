@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import logging
+from typing import Any
 
 from homismart_client.devices import SwitchableDevice
 from homismart_client.enums import DeviceType
@@ -27,27 +28,26 @@ async def async_setup_entry(
     """Set up the HomiSmart switch platform."""
     coordinator: HomiSmartCoordinator = hass.data[DOMAIN][entry.entry_id]
 
+    known_ids: set[str] = set()
+
     @callback
-    def async_add_switch(device: SwitchableDevice) -> None:
-        """Add a new HomiSmart switch entity."""
-        _LOGGER.info("Adding new switch: %s", device.name)
-        async_add_entities([HomiSmartSwitch(coordinator, device)])
+    def async_add_switches(devices: list[SwitchableDevice]) -> None:
+        """Add new HomiSmart switch entities."""
+        entities = []
+        for device in devices:
+            if device.id in known_ids:
+                continue
+            known_ids.add(device.id)
+            _LOGGER.info("Adding new switch: %s", device.name)
+            entities.append(HomiSmartSwitch(coordinator, device))
+        if entities:
+            async_add_entities(entities)
 
     entry.async_on_unload(
-        async_dispatcher_connect(hass, SIGNAL_NEW_SWITCH, async_add_switch)
+        async_dispatcher_connect(hass, SIGNAL_NEW_SWITCH, async_add_switches)
     )
 
-    for device in coordinator.device_registry.values():
-        if isinstance(device, SwitchableDevice):
-            dt = device.device_type_enum
-            if dt in (
-                DeviceType.SOCKET,
-                DeviceType.SOCKET_ALT,
-                DeviceType.DOUBLE_SWITCH_OR_SOCKET,
-                DeviceType.SWITCH_MULTI_GANG_A,
-            ):
-                # Only add outlet/switch types. Lights are handled separately.
-                async_add_switch(device)
+    async_add_switches(list(coordinator.platform_devices["switch"].values()))
 
 
 class HomiSmartSwitch(HomiSmartEntity, SwitchEntity):
@@ -66,13 +66,27 @@ class HomiSmartSwitch(HomiSmartEntity, SwitchEntity):
 
     @property
     def is_on(self) -> bool:
+        if self._optimistic_value is not None:
+            return self._optimistic_value
         return self.device.is_on
 
+    def _projected_state(self) -> tuple[Any, ...]:
+        return (*super()._projected_state(), self.is_on)
+
+    def _optimistic_confirmation(self, expected: bool) -> bool:
+        return self.device.is_on == expected
+
     async def async_turn_on(self, **kwargs) -> None:
-        await self.device.turn_on()
+        await self._async_optimistic_command(
+            True, self.coordinator.async_send_command(self.device, "turn_on")
+        )
 
     async def async_turn_off(self, **kwargs) -> None:
-        await self.device.turn_off()
+        await self._async_optimistic_command(
+            False, self.coordinator.async_send_command(self.device, "turn_off")
+        )
 
     async def async_toggle(self, **kwargs) -> None:
-        await self.device.toggle()
+        await self._async_optimistic_command(
+            not self.is_on, self.coordinator.async_send_command(self.device, "toggle")
+        )
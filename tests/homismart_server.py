@@ -0,0 +1,217 @@
+"""A local stand-in for the HomiSmart WebSocket server.
+
+Speaks the part of the protocol homismart_client uses: login, the device
+list (hubs included), state pushes, command acknowledgements and
+heartbeats. It runs in-process on 127.0.0.1, so a real HomismartClient, and
+HomiSmartCoordinator.connect(), can be exercised offline by pointing the
+client's ``_ws_url`` at ``server.url``:
+
+    server = HomismartServer(make_fleet(1000))
+    await server.start()
+    coordinator.client._ws_url = server.url
+    await coordinator.connect()
+
+Latency can be injected into every response, pushes generated at a
+configurable rate and connections dropped to test reconnects.
+"""
+import asyncio
+import json
+import random
+
+import websockets
+from homismart_client.enums import ErrorCode, ReceivePrefix, RequestPrefix
+from homismart_client.utils import md5_hash
+
+DEVICES_PER_HUB = 50
+# Device type codes: wall switch (light), socket (switch), curtain (cover).
+DEVICE_TYPES = (2, 1, 5)
+
+
+def make_fleet(size, per_hub=DEVICES_PER_HUB):
+    """Return a raw device list with hubs and *size* devices."""
+    hubs = max(1, size // per_hub)
+    fleet = [
+        {"id": f"00HUB{h:05d}", "name": f"Hub {h}", "type": 0, "onLine": True}
+        for h in range(hubs)
+    ]
+    for i in range(size):
+        device_type = DEVICE_TYPES[i % len(DEVICE_TYPES)]
+        device = {
+            "id": f"D{i:06d}",
+            "pid": f"00HUB{i % hubs:05d}",
+            "name": f"Device {i}",
+            "type": device_type,
+            "onLine": True,
+            "version": 1,
+        }
+        if device_type == 5:
+            device["curtainState"] = "0"
+        else:
+            device["power"] = False
+        fleet.append(device)
+    return fleet
+
+
+def _message(prefix, payload):
+    return prefix.value + json.dumps(payload)
+
+
+class HomismartServer:
+    """In-process HomiSmart server holding one account's devices."""
+
+    def __init__(
+        self,
+        devices=(),
+        username="test@test.com",
+        password="pass",
+        latency=0.0,
+        jitter=0.0,
+    ):
+        """Initialize the server with raw device dicts, hubs included."""
+        self.devices = {device["id"]: dict(device) for device in devices}
+        self.username = username
+        self.password_hash = md5_hash(password)
+        # Seconds added before each response, plus up to *jitter* at random.
+        self.latency = latency
+        self.jitter = jitter
+        # When False, logins are answered with a failed login response.
+        self.accept_logins = True
+        self.connections = set()
+        # (prefix, payload) of every message received, in order.
+        self.received = []
+        self.logins = 0
+        self.rejected_logins = 0
+        self.pushes = 0
+        self._server = None
+        self._tasks = set()
+        self._push_ids = [
+            device_id for device_id in self.devices if not device_id.startswith("00")
+        ]
+        self._push_cursor = 0
+
+    @property
+    def url(self):
+        """Return the WebSocket URL to point the client at."""
+        port = self._server.sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}/homismartmain/websocket"
+
+    async def start(self):
+        """Start listening on a free local port."""
+        self._server = await websockets.serve(self._handle_connection, "127.0.0.1", 0)
+
+    async def stop(self):
+        """Close all connections and stop listening."""
+        for task in self._tasks:
+            task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle_connection(self, ws):
+        self.connections.add(ws)
+        try:
+            async for raw in ws:
+                prefix, payload = raw[:4], json.loads(raw[4:] or "{}")
+                self.received.append((prefix, payload))
+                if prefix == RequestPrefix.HEARTBEAT.value:
+                    continue
+                # Respond out of band, so latency does not serialize requests.
+                task = asyncio.ensure_future(self._respond(ws, prefix, payload))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+
+    async def _respond(self, ws, prefix, payload):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if prefix == RequestPrefix.LOGIN.value:
+            ok = (
+                self.accept_logins
+                and payload.get("username") == self.username
+                and payload.get("password") == self.password_hash
+            )
+            if ok:
+                self.logins += 1
+            else:
+                self.rejected_logins += 1
+            reply = _message(ReceivePrefix.LOGIN_RESPONSE, {"result": ok})
+        elif prefix == RequestPrefix.LIST_DEVICES.value:
+            reply = _message(ReceivePrefix.DEVICE_LIST, list(self.devices.values()))
+        elif prefix == RequestPrefix.TOGGLE_PROPERTY.value:
+            device = self.devices.get(payload.get("id"))
+            if device is None:
+                reply = _message(
+                    ReceivePrefix.SERVER_ERROR,
+                    {"code": ErrorCode.PARAMETER_ERROR.value, "info": "unknown device"},
+                )
+            else:
+                # The acknowledgement is the device's state push, to every client.
+                changes = {k: v for k, v in payload.items() if k != "updateTime"}
+                self.push(device["id"], **changes)
+                return
+        else:
+            return
+        try:
+            await ws.send(reply)
+        except websockets.ConnectionClosed:
+            pass
+
+    def push(self, device_id, **changes):
+        """Change a device or hub and push its state to every client."""
+        device = self.devices[device_id]
+        device.update(changes)
+        self.pushes += 1
+        websockets.broadcast(
+            self.connections, _message(ReceivePrefix.DEVICE_UPDATE_PUSH, device)
+        )
+
+    def push_next(self):
+        """Flip the state of the next device, round robin, and push it."""
+        ids = self._push_ids
+        device = self.devices[ids[self._push_cursor % len(ids)]]
+        self._push_cursor += 1
+        if "curtainState" in device:
+            self.push(device["id"], curtainState="0" if device["curtainState"] != "0" else "100")
+        else:
+            self.push(device["id"], power=not device.get("power"))
+
+    async def run_pushes(self, rate, duration, tick=0.01):
+        """Push state changes at *rate* per second for *duration* seconds.
+
+        Returns the number of pushes sent.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent = 0
+        while (elapsed := loop.time() - start) < duration:
+            due = int(rate * elapsed) - sent
+            for _ in range(due):
+                self.push_next()
+            sent += due
+            await asyncio.sleep(tick)
+        return sent
+
+    def set_hub_online(self, hub_id, online):
+        """Take a hub offline or back online, as its children would see."""
+        self.push(hub_id, onLine=online)
+
+    async def drop_connections(self, abort=False):
+        """Force every client off, by a close frame or by aborting the socket.
+
+        Aborting simulates a network failure: the client sees no close frame.
+        """
+        for ws in list(self.connections):
+            if abort:
+                ws.transport.abort()
+            else:
+                await ws.close(1012, "Service restart")
@@ -4,6 +4,8 @@ All tests mock the homismart-client library and Home Assistant internals.
 No real server or HA instance needed.
 """
 import asyncio
+from collections import deque
+import time
 import sys
 import os
 from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
@@ -57,17 +59,47 @@ def _make_module(name, attrs=None):
 _callback = lambda f: f  # noqa: E731 — @callback is a no-op in tests
 
 _make_module("homeassistant")
-_make_module("homeassistant.const", {"CONF_USERNAME": "username", "CONF_PASSWORD": "password"})
-_make_module("homeassistant.core", {"HomeAssistant": MagicMock, "callback": _callback})
+_make_module("homeassistant.const", {
+    "CONF_USERNAME": "username",
+    "CONF_PASSWORD": "password",
+    "ATTR_ENTITY_ID": "entity_id",
+    "ATTR_DEVICE_ID": "device_id",
+    "EntityCategory": MagicMock(),
+    "UnitOfTime": MagicMock(),
+})
+_make_module("homeassistant.core", {
+    "HomeAssistant": MagicMock,
+    "callback": _callback,
+    "ServiceCall": MagicMock,
+    "ServiceResponse": dict,
+    "SupportsResponse": MagicMock(),
+    "CALLBACK_TYPE": MagicMock,
+})
 class _FakeConfigFlow:
     def __init_subclass__(cls, **kwargs):
         pass  # Accept domain= keyword argument
-_make_module("homeassistant.config_entries", {"ConfigEntry": MagicMock, "ConfigFlow": _FakeConfigFlow})
+class _FakeOptionsFlow:
+    pass
+_make_module("homeassistant.config_entries", {
+    "ConfigEntry": MagicMock,
+    "ConfigFlow": _FakeConfigFlow,
+    "OptionsFlow": _FakeOptionsFlow,
+})
 _make_module("homeassistant.data_entry_flow", {"FlowResult": MagicMock})
 _make_module("homeassistant.exceptions", {"ConfigEntryNotReady": ConfigEntryNotReady, "HomeAssistantError": Exception})
 _make_module("homeassistant.helpers")
 _make_module("homeassistant.helpers.entity", {"Entity": FakeEntity, "DeviceInfo": FakeDeviceInfo})
 _make_module("homeassistant.helpers.entity_platform", {"AddEntitiesCallback": MagicMock})
+_make_module("homeassistant.helpers.config_validation", {
+    "entity_ids": MagicMock(),
+    "ensure_list": MagicMock(),
+    "string": MagicMock(),
+})
+
+ent_reg_mock = MagicMock()
+_make_module("homeassistant.helpers.entity_registry", {
+    "async_get": ent_reg_mock.async_get,
+})
 
 dispatcher_mock = MagicMock()
 _make_module("homeassistant.helpers.dispatcher", {
@@ -75,12 +107,53 @@ _make_module("homeassistant.helpers.dispatcher", {
     "async_dispatcher_connect": dispatcher_mock.async_dispatcher_connect,
 })
 
+class FakeStore:
+    """In-memory stand-in for homeassistant.helpers.storage.Store."""
+
+    def __init__(self, hass, version, key, **kwargs):
+        self.key = key
+        self.data = None
+
+    async def async_load(self):
+        return self.data
+
+    async def async_save(self, data):
+        self.data = data
+
+    def async_delay_save(self, data_func, delay=0):
+        self.delayed_save = data_func
+
+    async def async_remove(self):
+        self.data = None
+        self.removed = True
+
+_make_module("homeassistant.helpers.storage", {"Store": FakeStore})
+
 dev_reg_mock = MagicMock()
 _make_module("homeassistant.helpers.device_registry", {
     "async_get": dev_reg_mock.async_get,
 })
 
 _make_module("homeassistant.components")
+
+
+def _redact(data, to_redact):
+    if isinstance(data, list):
+        return [_redact(item, to_redact) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: "**REDACTED**" if key in to_redact else _redact(value, to_redact)
+        for key, value in data.items()
+    }
+
+
+_make_module("homeassistant.components.sensor", {
+    "SensorEntity": FakeEntity,
+    "SensorDeviceClass": MagicMock(),
+    "SensorStateClass": MagicMock(),
+})
+_make_module("homeassistant.components.diagnostics", {"async_redact_data": _redact})
 _make_module("homeassistant.components.light", {
     "LightEntity": FakeLightEntity,
     "ColorMode": FakeColorMode,
@@ -107,11 +180,11 @@ from custom_components.homismart.const import (
     SIGNAL_NEW_LIGHT,
     SIGNAL_NEW_SWITCH,
     SIGNAL_NEW_COVER,
-    SIGNAL_UPDATE_DEVICE,
 )
 from custom_components.homismart.coordinator import HomiSmartCoordinator
 from custom_components.homismart.entity import HomiSmartEntity
 from custom_components.homismart.light import HomiSmartLight
+from custom_components.homismart.cover import HomiSmartCover
 
 
 # ---------------------------------------------------------------------------
@@ -122,8 +195,10 @@ def _make_coordinator():
     """Create a coordinator with mocked HA and client."""
     hass = MagicMock()
     hass.loop = asyncio.get_event_loop()
+    hass.async_create_task = hass.loop.create_task
     entry = MagicMock()
     entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {}
     entry.entry_id = "test_entry_id"
 
     with patch("custom_components.homismart.coordinator.HomismartClient") as MockClient:
@@ -196,6 +271,7 @@ async def test_setup_entry_connection_failure():
     hass.data = {}
     entry = MagicMock()
     entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {}
     entry.entry_id = "test_entry"
 
     with patch("custom_components.homismart.coordinator.HomismartClient") as MockClient:
@@ -309,6 +385,7 @@ def test_entity_device_info_no_via_device():
 # ---------------------------------------------------------------------------
 # Fix 9: _handle_new_device dispatching + error handling
 # ---------------------------------------------------------------------------
+# New devices are buffered and announced to platforms as lists.
 
 def test_handle_new_device_light():
     """DeviceType.SWITCH should dispatch SIGNAL_NEW_LIGHT."""
@@ -318,9 +395,10 @@ def test_handle_new_device_light():
     device = _make_device(device_type_enum=DeviceType.SWITCH)
 
     coordinator._handle_new_device(device)
+    coordinator._async_flush_new_devices()
 
     dispatcher_mock.async_dispatcher_send.assert_called_with(
-        hass, SIGNAL_NEW_LIGHT, device
+        hass, SIGNAL_NEW_LIGHT, [device]
     )
 
 
@@ -332,9 +410,10 @@ def test_handle_new_device_switch():
     device = _make_device(device_type_enum=DeviceType.SOCKET)
 
     coordinator._handle_new_device(device)
+    coordinator._async_flush_new_devices()
 
     dispatcher_mock.async_dispatcher_send.assert_called_with(
-        hass, SIGNAL_NEW_SWITCH, device
+        hass, SIGNAL_NEW_SWITCH, [device]
     )
 
 
@@ -346,9 +425,10 @@ def test_handle_new_device_cover():
     device = _make_device(device_type_enum=DeviceType.CURTAIN)
 
     coordinator._handle_new_device(device)
+    coordinator._async_flush_new_devices()
 
     dispatcher_mock.async_dispatcher_send.assert_called_with(
-        hass, SIGNAL_NEW_COVER, device
+        hass, SIGNAL_NEW_COVER, [device]
     )
 
 
@@ -431,3 +511,1818 @@ async def test_light_turn_off():
     light = HomiSmartLight(coordinator, device)
     await light.async_turn_off()
     device.turn_off.assert_awaited_once()
+
+
+# ---------------------------------------------------------------------------
+# Coalesced device updates
+# ---------------------------------------------------------------------------
+
+def _subscribe_all(coordinator, device_ids):
+    """Subscribe to devices; returns the list of IDs notified, in order."""
+    notified = []
+    for device_id in device_ids:
+        coordinator.async_subscribe_device(
+            device_id, lambda device_id=device_id: notified.append(device_id)
+        )
+    return notified
+
+
+@pytest.mark.asyncio
+async def test_device_update_burst_coalesced():
+    """A burst of pushes should produce one update signal per device."""
+    coordinator, _, _ = _make_coordinator()
+    devices = [_make_device(device_id=f"dev{i}") for i in range(10)]
+    notified = _subscribe_all(coordinator, [d.id for d in devices])
+
+    for _ in range(10):
+        for device in devices:
+            coordinator._handle_device_update(device)
+
+    assert notified == []
+    await asyncio.sleep(0)
+
+    assert sorted(notified) == sorted(d.id for d in devices)
+    assert coordinator.counters["device_updated"] == 100
+    assert coordinator.counters["update_signals"] == 10
+
+
+@pytest.mark.asyncio
+async def test_device_update_window():
+    """With an update window, the flush waits for the window to elapse."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.update_window = 0.05
+    device = _make_device()
+    notified = _subscribe_all(coordinator, ["dev1"])
+
+    coordinator._handle_device_update(device)
+    await asyncio.sleep(0)
+    coordinator._handle_device_update(device)
+    assert notified == []
+
+    await asyncio.sleep(0.1)
+    assert notified == ["dev1"]
+
+
+# ---------------------------------------------------------------------------
+# Suppressed no-op state writes
+# ---------------------------------------------------------------------------
+
+def test_unchanged_state_write_suppressed():
+    """Only pushes that change the projected state should write."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(is_on=True)
+    light = HomiSmartLight(coordinator, device)
+    light.async_write_ha_state = MagicMock()
+    light._last_written_state = light._projected_state()
+
+    light._update_callback()
+    assert light.async_write_ha_state.call_count == 0
+    assert coordinator.counters["state_writes_suppressed"] == 1
+
+    device.is_on = False
+    light._update_callback()
+    light._update_callback()
+    assert light.async_write_ha_state.call_count == 1
+
+    device.is_online = False
+    light._update_callback()
+    assert light.async_write_ha_state.call_count == 2
+    assert coordinator.counters["state_writes"] == 2
+    assert coordinator.counters["state_writes_suppressed"] == 2
+
+
+# ---------------------------------------------------------------------------
+# Hub fan-out limited to the hub's children
+# ---------------------------------------------------------------------------
+
+def _make_hub(hub_id="hub1", is_online=True):
+    hub = MagicMock()
+    hub.id = hub_id
+    hub.name = f"Hub {hub_id}"
+    hub.is_online = is_online
+    hub.pid = None
+    return hub
+
+
+@pytest.mark.asyncio
+async def test_hub_update_fans_out_to_children_on_change():
+    """Hub updates only notify that hub's devices, and only on online change."""
+    coordinator, _, _ = _make_coordinator()
+    for i in range(3):
+        coordinator._handle_new_device(_make_device(device_id=f"a{i}", pid="hubA"))
+        coordinator._handle_new_device(_make_device(device_id=f"b{i}", pid="hubB"))
+    hub = _make_hub("hubA")
+    notified = _subscribe_all(
+        coordinator, [f"{p}{i}" for p in "ab" for i in range(3)]
+    )
+
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        coordinator._handle_hub_update(hub)
+        await asyncio.sleep(0)
+
+        # Same online state: nothing to do.
+        coordinator._handle_hub_update(hub)
+        await asyncio.sleep(0)
+        assert notified == []
+
+        hub.is_online = False
+        coordinator._handle_hub_update(hub)
+        await asyncio.sleep(0)
+
+    assert sorted(notified) == [f"a{i}" for i in range(3)]
+
+
+def test_hub_index_follows_pid_change():
+    """A device moving to another hub should be re-indexed."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(device_id="d1", pid="hubA")
+    coordinator._handle_new_device(device)
+    assert coordinator.hub_children == {"hubA": {"d1"}}
+
+    device.pid = "hubB"
+    coordinator._handle_device_update(device)
+    assert coordinator.hub_children == {"hubA": set(), "hubB": {"d1"}}
+
+
+# ---------------------------------------------------------------------------
+# Batched entity creation
+# ---------------------------------------------------------------------------
+
+async def _setup_platforms(coordinator, hass, entry):
+    """Set up all entity platforms, routing dispatcher signals to them.
+
+    Returns a mapping of platform name -> the async_add_entities mock.
+    """
+    from custom_components.homismart import cover, light, switch
+
+    listeners = {}
+
+    def _connect(_hass, signal, target):
+        listeners.setdefault(signal, []).append(target)
+        return MagicMock()
+
+    def _send(_hass, signal, *args):
+        for target in listeners.get(signal, []):
+            target(*args)
+
+    dispatcher_mock.async_dispatcher_connect.side_effect = _connect
+    dispatcher_mock.async_dispatcher_send.side_effect = _send
+    hass.data = {DOMAIN: {entry.entry_id: coordinator}}
+    adders = {}
+    for name, module in (("light", light), ("switch", switch), ("cover", cover)):
+        adders[name] = MagicMock()
+        await module.async_setup_entry(hass, entry, adders[name])
+    return adders
+
+
+@pytest.fixture
+def routed_dispatcher():
+    """Restore the shared dispatcher mock after a routing test."""
+    yield
+    dispatcher_mock.async_dispatcher_connect.side_effect = None
+    dispatcher_mock.async_dispatcher_send.side_effect = None
+    dispatcher_mock.reset_mock()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", [50, 500, 5000])
+async def test_discovery_burst_added_in_one_batch(count, routed_dispatcher):
+    """A discovery burst should reach each platform as a single add call."""
+    from types import SimpleNamespace
+    from homismart_client.enums import DeviceType
+
+    coordinator, hass, entry = _make_coordinator()
+    device_types = [DeviceType.SWITCH, DeviceType.SOCKET, DeviceType.CURTAIN]
+    # Plain objects keep large bursts cheap to build.
+    devices = [
+        SimpleNamespace(
+            id=f"dev{i}", name=f"Device {i}", pid=f"hub{i % 4}",
+            device_type_enum=device_types[i % 3],
+            device_type_code=device_types[i % 3].value,
+            is_online=True, version=1, raw={"id": f"dev{i}"},
+        )
+        for i in range(count)
+    ]
+
+    adders = await _setup_platforms(coordinator, hass, entry)
+    for device in devices:
+        coordinator._handle_new_device(device)
+    # Fire the pending batch now rather than waiting out the window.
+    coordinator._new_device_handle.cancel()
+    coordinator._async_flush_new_devices()
+
+    added = 0
+    for adder in adders.values():
+        assert adder.call_count == 1
+        added += len(adder.call_args.args[0])
+    assert added == count
+
+
+@pytest.mark.asyncio
+async def test_scanned_device_not_added_twice(routed_dispatcher):
+    """A device seen by the initial scan and a pending batch is added once."""
+    from homismart_client.enums import DeviceType
+
+    coordinator, hass, entry = _make_coordinator()
+    device = _make_device(device_type_enum=DeviceType.SWITCH)
+    coordinator._handle_new_device(device)
+
+    adders = await _setup_platforms(coordinator, hass, entry)
+    coordinator._async_flush_new_devices()
+
+    assert adders["light"].call_count == 1
+
+
+# ---------------------------------------------------------------------------
+# DeviceType routing table and per-platform indexes
+# ---------------------------------------------------------------------------
+
+def test_routing_table_builds_platform_indexes():
+    """Devices are indexed under the platform from the routing table."""
+    from homismart_client.enums import DeviceType
+    from custom_components.homismart.coordinator import DEVICE_TYPE_PLATFORMS
+
+    coordinator, _, _ = _make_coordinator()
+    for device_type, platform in DEVICE_TYPE_PLATFORMS.items():
+        device = _make_device(device_id=device_type.name, device_type_enum=device_type)
+        coordinator._handle_new_device(device)
+        assert coordinator.platform_devices[platform][device.id] is device
+
+    lock = _make_device(device_id="lock", device_type_enum=DeviceType.DOOR_LOCK)
+    coordinator._handle_new_device(lock)
+    assert all("lock" not in devices for devices in coordinator.platform_devices.values())
+    assert sum(map(len, coordinator.platform_devices.values())) == len(DEVICE_TYPE_PLATFORMS)
+
+
+def test_retyped_device_moves_platform():
+    """A device re-created with a different type is re-indexed."""
+    from homismart_client.enums import DeviceType
+
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(device_type_enum=DeviceType.SWITCH)
+    coordinator._handle_new_device(device)
+    device.device_type_enum = DeviceType.SOCKET
+    coordinator._handle_new_device(device)
+
+    assert coordinator.platform_devices["light"] == {}
+    assert coordinator.platform_devices["switch"] == {"dev1": device}
+
+
+# ---------------------------------------------------------------------------
+# Persistent topology cache
+# ---------------------------------------------------------------------------
+
+def _attach_real_session(coordinator):
+    """Give the coordinator a real HomismartSession over the mocked client."""
+    from homismart_client.session import HomismartSession
+
+    coordinator.client.session = HomismartSession(coordinator.client)
+    return coordinator.client.session
+
+
+TOPOLOGY = [
+    {"id": "00HUB1", "name": "Main Unit", "type": 0, "onLine": True},
+    {"id": "L1", "pid": "00HUB1", "name": "Hall", "type": 2, "onLine": True, "power": True},
+    {"id": "S1", "pid": "00HUB1", "name": "Plug", "type": 1, "onLine": True, "power": False},
+    {"id": "C1", "pid": "00HUB1", "name": "Blind", "type": 5, "onLine": True, "curtainState": "40"},
+]
+
+
+@pytest.mark.asyncio
+async def test_topology_snapshot_round_trip():
+    """Devices restored from the cache are routed and later reconciled."""
+    from homismart_client.enums import ReceivePrefix
+
+    source, _, _ = _make_coordinator()
+    session = _attach_real_session(source)
+    source._async_register_listeners()
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, TOPOLOGY)
+    cached = source._store.delayed_save()
+    assert {d["id"] for d in cached["devices"]} == {"00HUB1", "L1", "S1", "C1"}
+
+    coordinator, _, _ = _make_coordinator()
+    session = _attach_real_session(coordinator)
+    coordinator._store.data = cached
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        assert await coordinator.async_restore_topology() is True
+    assert set(coordinator.platform_devices["light"]) == {"L1"}
+    assert set(coordinator.platform_devices["switch"]) == {"S1"}
+    assert coordinator.platform_devices["cover"]["C1"].current_level == 40
+    assert coordinator.hub_children["00HUB1"] == {"L1", "S1", "C1"}
+
+    # The live list updates the restored objects and drops removed devices.
+    restored_light = coordinator.device_registry["L1"]
+    live = [dict(d) for d in TOPOLOGY if d["id"] != "S1"]
+    live[1]["power"] = False
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, live)
+    assert coordinator.device_registry["L1"] is restored_light
+    assert restored_light.is_on is False
+    assert "S1" not in coordinator.device_registry
+    assert "S1" not in coordinator.platform_devices["switch"]
+
+
+@pytest.mark.asyncio
+async def test_topology_saved_on_changes_and_state_on_disconnect():
+    """Plain state pushes wait for disconnect; topology changes are saved."""
+    coordinator, _, _ = _make_coordinator()
+    store = coordinator._store
+    device = _make_device()
+    coordinator._handle_new_device(device)
+    store.delayed_save()
+    store.delayed_save = None
+
+    device.is_on = False
+    coordinator._handle_device_update(device)
+    assert store.delayed_save is None
+
+    device.name = "Kitchen"
+    device.raw["name"] = "Kitchen"
+    coordinator._handle_device_update(device)
+    assert store.delayed_save is not None
+
+    await coordinator.disconnect()
+    assert store.data == {"devices": [{"id": "dev1", "name": "Kitchen"}]}
+
+
+@pytest.mark.asyncio
+async def test_setup_entry_with_cached_topology_connects_first():
+    """In foreground mode the cache is loaded, but platforms wait for login."""
+    from custom_components.homismart import async_setup_entry
+
+    order = []
+    hass = MagicMock()
+    hass.loop = asyncio.get_event_loop()
+    hass.data = {}
+    hass.config_entries.async_forward_entry_setups = AsyncMock(
+        side_effect=lambda *args: order.append("platforms")
+    )
+    entry = MagicMock()
+    entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {}
+    entry.entry_id = "test_entry"
+
+    with patch("custom_components.homismart.coordinator.HomismartClient") as MockClient, \
+            patch.object(FakeStore, "async_load", AsyncMock(return_value={"devices": TOPOLOGY})):
+        mock_client = MockClient.return_value
+        mock_client.connect = AsyncMock(side_effect=lambda **kw: order.append("connect"))
+        mock_client.session = MagicMock()
+
+        assert await async_setup_entry(hass, entry) is True
+
+    assert order == ["connect", "platforms"]
+    mock_client.session.dispatch_message.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_setup_entry_with_cached_topology_failure_sets_up_nothing():
+    """A failed foreground connect never forwards, so never tears down, platforms."""
+    from custom_components.homismart import async_setup_entry
+
+    hass = MagicMock()
+    hass.loop = asyncio.get_event_loop()
+    hass.data = {}
+    hass.config_entries.async_forward_entry_setups = AsyncMock()
+    hass.config_entries.async_unload_platforms = AsyncMock()
+    entry = MagicMock()
+    entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {}
+    entry.entry_id = "test_entry"
+
+    from homismart_client.session import HomismartSession
+
+    created = []
+
+    def _create(*args):
+        created.append(HomiSmartCoordinator(*args))
+        return created[-1]
+
+    cached = {"devices": [dict(d) for d in TOPOLOGY]}
+    with patch("custom_components.homismart.coordinator.HomismartClient") as MockClient, \
+            patch("custom_components.homismart.HomiSmartCoordinator", _create), \
+            patch("custom_components.homismart.coordinator.dr.async_get"), \
+            patch.object(FakeStore, "async_load", AsyncMock(return_value=cached)):
+        mock_client = MockClient.return_value
+        mock_client.connect = AsyncMock(side_effect=asyncio.TimeoutError("timeout"))
+        mock_client.disconnect = AsyncMock()
+        mock_client.session = HomismartSession(mock_client)
+
+        with pytest.raises(ConfigEntryNotReady):
+            await async_setup_entry(hass, entry)
+
+    hass.config_entries.async_forward_entry_setups.assert_not_awaited()
+    hass.config_entries.async_unload_platforms.assert_not_awaited()
+    assert hass.data[DOMAIN] == {}
+    [coordinator] = created
+    assert len(coordinator.device_registry) == 4
+    assert coordinator._new_device_handle is None
+    assert coordinator._flush_handle is None
+    assert coordinator._ingest_handle is None
+    assert not coordinator._topology_save_pending
+    mock_client.disconnect.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_remove_entry_deletes_cached_topology():
+    """Removing an entry deletes its topology store."""
+    from custom_components.homismart import async_remove_entry
+
+    removed = []
+
+    async def _remove(store):
+        removed.append(store.key)
+
+    entry = MagicMock(entry_id="test_entry")
+    with patch.object(FakeStore, "async_remove", _remove, create=True):
+        await async_remove_entry(MagicMock(), entry)
+    assert removed == ["homismart.test_entry.topology"]
+
+
+# ---------------------------------------------------------------------------
+# Background connect
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_background_connect_retries_with_backoff():
+    """Failed logins are retried with growing, jittered delays."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.client.connect = AsyncMock(
+        side_effect=[ConnectionError("down"), ConnectionError("down"), None]
+    )
+    delays = []
+
+    async def _fake_sleep(delay):
+        delays.append(delay)
+
+    with patch("custom_components.homismart.coordinator.asyncio.sleep", _fake_sleep):
+        await coordinator._async_connect_with_backoff()
+
+    assert coordinator.client.connect.await_count == 3
+    assert 5 <= delays[0] <= 6.25
+    assert 10 <= delays[1] <= 12.5
+    assert coordinator.counters["connect_failures"] == 2
+
+
+@pytest.mark.asyncio
+async def test_setup_entry_background_connect_returns_immediately():
+    """In background mode, setup succeeds even while the cloud is down."""
+    from custom_components.homismart import async_setup_entry
+
+    hass = MagicMock()
+    hass.loop = asyncio.get_event_loop()
+    hass.data = {}
+    hass.config_entries.async_forward_entry_setups = AsyncMock()
+    entry = MagicMock()
+    entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {"background_connect": True}
+    entry.entry_id = "test_entry"
+    entry.async_create_background_task = MagicMock(
+        side_effect=lambda _hass, coro, name: asyncio.ensure_future(coro)
+    )
+
+    with patch("custom_components.homismart.coordinator.HomismartClient") as MockClient:
+        mock_client = MockClient.return_value
+        mock_client.connect = AsyncMock(side_effect=asyncio.TimeoutError("timeout"))
+        mock_client.disconnect = AsyncMock()
+        mock_client.session = MagicMock()
+
+        assert await async_setup_entry(hass, entry) is True
+        hass.config_entries.async_forward_entry_setups.assert_awaited_once()
+
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        await asyncio.sleep(0)
+        assert coordinator.counters["connect_failures"] == 1
+        await coordinator.disconnect()
+        assert coordinator._connect_task is None
+
+
+# ---------------------------------------------------------------------------
+# Latest-wins cover position gate
+# ---------------------------------------------------------------------------
+
+def _make_slow_cover(coordinator, delay=0.02):
+    """Create a cover whose device takes *delay* seconds per command."""
+    device = _make_device(device_id="cover1")
+    device.current_level = 0
+    sent = []
+
+    async def _set_level(level):
+        sent.append(level)
+        await asyncio.sleep(delay)
+
+    device.set_level = AsyncMock(side_effect=_set_level)
+    device.stop = AsyncMock()
+    return HomiSmartCover(coordinator, device), sent
+
+
+@pytest.mark.asyncio
+async def test_cover_slider_drag_sends_first_and_last_position():
+    """Intermediate targets requested while a command is in flight are dropped."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.cover_settle_time = 0
+    cover, sent = _make_slow_cover(coordinator)
+
+    first = asyncio.ensure_future(cover.async_set_cover_position(position=10))
+    await asyncio.sleep(0)
+    for position in (20, 30, 40, 50):
+        await cover.async_set_cover_position(position=position)
+    await first
+    await _wait_for(lambda: not cover._position_gate_busy)
+
+    assert sent == [10, 50]
+    assert coordinator.counters["cover_positions_superseded"] == 3
+
+
+@pytest.mark.asyncio
+async def test_cover_settle_time_holds_gate():
+    """The gate stays closed for the settle time after each command."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.cover_settle_time = 0.05
+    cover, sent = _make_slow_cover(coordinator, delay=0)
+
+    await cover.async_set_cover_position(position=10)
+    await asyncio.sleep(0.01)
+    await cover.async_set_cover_position(position=60)
+    assert sent == [10]
+    await _wait_for(lambda: sent == [10, 60])
+
+
+@pytest.mark.asyncio
+async def test_cover_position_returns_without_waiting_to_settle():
+    """A caller whose position is sent does not wait out the settle time."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.cover_settle_time = 60
+    cover, sent = _make_slow_cover(coordinator, delay=0)
+
+    await cover.async_set_cover_position(position=10)
+    assert sent == [10]
+    # Returned while the gate is still held for the settle time.
+    assert cover._position_gate_busy
+    cover._async_cancel_position_gate()
+
+
+@pytest.mark.asyncio
+async def test_cover_stop_discards_pending_position():
+    """Stopping the cover drops a queued position target."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.cover_settle_time = 0
+    cover, sent = _make_slow_cover(coordinator)
+
+    first = asyncio.ensure_future(cover.async_set_cover_position(position=10))
+    await asyncio.sleep(0)
+    await cover.async_set_cover_position(position=90)
+    await cover.async_stop_cover()
+    await first
+
+    assert sent == [10]
+    cover.device.stop.assert_awaited_once()
+
+
+# ---------------------------------------------------------------------------
+# Optimistic state
+# ---------------------------------------------------------------------------
+
+def _make_optimistic_light(timeout=5.0):
+    coordinator, hass, _ = _make_coordinator()
+    coordinator.optimistic = True
+    coordinator.optimistic_timeout = timeout
+    device = _make_device(is_on=False)
+    light = HomiSmartLight(coordinator, device)
+    light.hass = hass
+    light.entity_id = "light.test"
+    light.async_write_ha_state = MagicMock()
+    light._last_written_state = light._projected_state()
+    return coordinator, device, light
+
+
+@pytest.mark.asyncio
+async def test_optimistic_light_confirmed_by_push():
+    """The expected state is written at once and kept when confirmed."""
+    coordinator, device, light = _make_optimistic_light()
+
+    await light.async_turn_on()
+    assert light.is_on is True
+    assert light.async_write_ha_state.call_count == 1
+
+    device.is_on = True
+    light._update_callback()
+    assert light._optimistic_value is None
+    assert light._optimistic_expiry is None
+    assert light.is_on is True
+    # The confirming push changes nothing visible.
+    assert light.async_write_ha_state.call_count == 1
+    assert coordinator.counters["optimistic_rollbacks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_optimistic_light_rolls_back_on_timeout():
+    """Without a confirming push the state is rolled back after the timeout."""
+    coordinator, _, light = _make_optimistic_light(timeout=0.02)
+
+    await light.async_turn_on()
+    assert light.is_on is True
+    await asyncio.sleep(0.05)
+
+    assert light.is_on is False
+    assert light.async_write_ha_state.call_count == 2
+    assert coordinator.counters["optimistic_rollbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_optimistic_light_rolls_back_on_contradiction():
+    """A push reporting the opposite state rolls back immediately."""
+    coordinator, _, light = _make_optimistic_light()
+
+    await light.async_turn_on()
+    light._update_callback()
+
+    assert light.is_on is False
+    assert light._optimistic_expiry is None
+    assert coordinator.counters["optimistic_rollbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_optimistic_light_rolls_back_on_command_error():
+    """A failed command rolls back and re-raises."""
+    coordinator, device, light = _make_optimistic_light()
+    device.turn_on = AsyncMock(side_effect=ConnectionError("down"))
+
+    with pytest.raises(ConnectionError):
+        await light.async_turn_on()
+    assert light.is_on is False
+    assert light._optimistic_expiry is None
+
+
+def test_base_entity_optimistic_confirmation_is_undecided():
+    """The shared entity never confirms or contradicts an optimistic value."""
+    coordinator, _, _ = _make_coordinator()
+    entity = HomiSmartEntity(coordinator, _make_device())
+    assert entity._optimistic_confirmation(True) is None
+
+
+@pytest.mark.asyncio
+async def test_optimistic_cover_waits_through_intermediate_positions():
+    """Positions passed while moving neither confirm nor roll back."""
+    coordinator, hass, _ = _make_coordinator()
+    coordinator.optimistic = True
+    coordinator.cover_settle_time = 0
+    cover, _ = _make_slow_cover(coordinator, delay=0)
+    cover.hass = hass
+    cover.entity_id = "cover.test"
+    cover.async_write_ha_state = MagicMock()
+
+    await cover.async_set_cover_position(position=80)
+    assert cover.current_cover_position == 80
+
+    cover.device.current_level = 40
+    cover._update_callback()
+    assert cover.current_cover_position == 80
+
+    cover.device.current_level = 80
+    cover._update_callback()
+    assert cover._optimistic_value is None
+    assert coordinator.counters["optimistic_rollbacks"] == 0
+
+
+# ---------------------------------------------------------------------------
+# Per-hub command scheduler
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_concurrency_per_hub():
+    """No more than max_concurrency commands run at once on one hub."""
+    from custom_components.homismart.scheduler import CommandScheduler
+
+    scheduler = CommandScheduler(max_concurrency=2, min_interval=0)
+    running = {"hubA": 0, "hubB": 0}
+    peak = {"hubA": 0, "hubB": 0}
+
+    def _job(hub_id):
+        async def _run():
+            running[hub_id] += 1
+            peak[hub_id] = max(peak[hub_id], running[hub_id])
+            await asyncio.sleep(0.01)
+            running[hub_id] -= 1
+        return _run
+
+    await asyncio.gather(*(
+        scheduler.async_run(hub_id, f"{hub_id}-{i}", _job(hub_id))
+        for i in range(6)
+        for hub_id in ("hubA", "hubB")
+    ))
+
+    assert peak == {"hubA": 2, "hubB": 2}
+    stats = scheduler.stats()
+    assert stats["hubA"]["commands"] == 6
+    assert stats["hubA"]["depth"] == 0
+    # The first two start at once; the other four queue up.
+    assert stats["hubA"]["max_depth"] == 4
+    assert stats["hubA"]["max_wait_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_keeps_device_order_and_spacing():
+    """Commands for one device run in FIFO order, spaced by min_interval."""
+    import time
+    from custom_components.homismart.scheduler import CommandScheduler
+
+    scheduler = CommandScheduler(max_concurrency=4, min_interval=0.02)
+    started = []
+
+    def _job(label):
+        async def _run():
+            started.append((label, time.monotonic()))
+        return _run
+
+    await asyncio.gather(*(
+        scheduler.async_run("hub1", "dev1", _job(i)) for i in range(4)
+    ))
+
+    assert [label for label, _ in started] == [0, 1, 2, 3]
+    gaps = [b - a for (_, a), (_, b) in zip(started, started[1:])]
+    assert all(gap >= 0.015 for gap in gaps)
+
+
+@pytest.mark.asyncio
+async def test_entity_commands_go_through_scheduler():
+    """Entity commands are queued under the device's hub."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(pid="hubX")
+
+    light = HomiSmartLight(coordinator, device)
+    await light.async_turn_on()
+
+    device.turn_on.assert_awaited_once()
+    assert coordinator.scheduler.stats()["hubX"]["commands"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Bulk command service
+# ---------------------------------------------------------------------------
+
+def _registered_service(hass, service):
+    """Return the handler registered for a HomiSmart service."""
+    for call in hass.services.async_register.call_args_list:
+        if call.args[:2] == (DOMAIN, service):
+            return call.args[2]
+    raise AssertionError(f"{service} was not registered")
+
+
+@pytest.mark.asyncio
+async def test_bulk_command_runs_devices_concurrently():
+    """80 devices across hubs finish in about one command round trip."""
+    import time
+
+    coordinator, _, _ = _make_coordinator()
+
+    async def _slow_off():
+        await asyncio.sleep(0.05)
+
+    for i in range(80):
+        device = _make_device(device_id=f"dev{i}", pid=f"hub{i % 20}")
+        device.turn_off = AsyncMock(side_effect=_slow_off)
+        coordinator.device_registry[device.id] = device
+    coordinator.device_registry["dev0"].turn_off = AsyncMock(
+        side_effect=ConnectionError("down")
+    )
+
+    ids = [f"dev{i}" for i in range(80)] + ["missing"]
+    start = time.perf_counter()
+    results = await coordinator.async_bulk_command(ids, "off")
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.05 * 3
+    assert results["dev0"] == "error: down"
+    assert results["missing"] == "unknown_device"
+    assert list(results.values()).count("ok") == 79
+
+
+@pytest.mark.asyncio
+async def test_bulk_command_service_resolves_entities_and_devices():
+    """The service maps entity and device registry IDs to HomiSmart devices."""
+    from custom_components.homismart.services import (
+        SERVICE_BULK_COMMAND,
+        async_setup_services,
+    )
+
+    coordinator, hass, _ = _make_coordinator()
+    cover = _make_device(device_id="C1")
+    cover.set_level = AsyncMock()
+    light = _make_device(device_id="L1")
+    light.set_level = AsyncMock()
+    for device in (cover, light):
+        coordinator.device_registry[device.id] = device
+    hass.data = {DOMAIN: {"entry": coordinator}}
+    hass.services.has_service.return_value = False
+    async_setup_services(hass)
+    handler = _registered_service(hass, SERVICE_BULK_COMMAND)
+
+    ent_reg_mock.async_get.return_value.async_get.return_value = MagicMock(
+        platform=DOMAIN, unique_id="C1"
+    )
+    dev_reg_mock.async_get.return_value.async_get.side_effect = lambda device_id: (
+        MagicMock(identifiers={(DOMAIN, "L1")}) if device_id == "ha-device-1" else None
+    )
+    call = MagicMock()
+    call.data = {
+        "entity_id": ["cover.blind"],
+        "device_id": ["ha-device-1", "C1", "nope"],
+        "action": "set_level",
+        "level": 30,
+    }
+    try:
+        response = await handler(call)
+    finally:
+        dev_reg_mock.async_get.return_value.async_get.side_effect = None
+
+    assert response == {"results": {"nope": "unknown_device", "C1": "ok", "L1": "ok"}}
+    cover.set_level.assert_awaited_once_with(30)
+    light.set_level.assert_awaited_once_with(30)
+
+
+# ---------------------------------------------------------------------------
+# Scene snapshots
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_restore_snapshot_only_sends_differences():
+    """Devices already in their recorded state get no command."""
+    coordinator, _, _ = _make_coordinator()
+    lights = [_make_device(device_id=f"L{i}", is_on=True) for i in range(3)]
+    cover = _make_device(device_id="C1")
+    cover.current_level = 40
+    cover.set_level = AsyncMock()
+    for device in lights:
+        coordinator.device_registry[device.id] = device
+        coordinator.platform_devices["light"][device.id] = device
+    coordinator.device_registry["C1"] = cover
+    coordinator.platform_devices["cover"]["C1"] = cover
+
+    assert coordinator.async_create_snapshot("evening") == 4
+
+    lights[0].is_on = False
+    cover.current_level = 100
+    restored = await coordinator.async_restore_snapshot("evening")
+
+    assert restored == {
+        "sent": 2,
+        "skipped": 2,
+        "results": {"L0": "ok", "C1": "ok"},
+    }
+    lights[0].turn_on.assert_awaited_once()
+    cover.set_level.assert_awaited_once_with(40)
+    lights[1].turn_on.assert_not_awaited()
+    lights[2].turn_off.assert_not_awaited()
+    assert coordinator.counters["snapshot_commands_skipped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_restore_snapshot_service_rejects_unknown_name():
+    """Restoring a snapshot no coordinator knows raises an error."""
+    from custom_components.homismart.services import (
+        SERVICE_RESTORE_SNAPSHOT,
+        async_setup_services,
+    )
+
+    coordinator, hass, _ = _make_coordinator()
+    assert await coordinator.async_restore_snapshot("missing") is None
+    hass.data = {DOMAIN: {"entry": coordinator}}
+    hass.services.has_service.return_value = False
+    async_setup_services(hass)
+    handler = _registered_service(hass, SERVICE_RESTORE_SNAPSHOT)
+
+    call = MagicMock()
+    call.data = {"name": "missing"}
+    with pytest.raises(Exception, match="Unknown HomiSmart snapshot"):
+        await handler(call)
+
+
+def test_snapshot_ignores_hubs_and_unsupported_devices():
+    """Only lights, switches and covers are recorded, even when named."""
+    coordinator, _, _ = _make_coordinator()
+    light = _make_device(device_id="L1", is_on=False)
+    coordinator.device_registry["L1"] = light
+    coordinator.platform_devices["light"]["L1"] = light
+    coordinator.device_registry["00HUB1"] = _make_hub("00HUB1")
+    coordinator.device_registry["LOCK1"] = _make_device(device_id="LOCK1")
+
+    assert coordinator.async_create_snapshot("away", ["L1", "00HUB1", "LOCK1"]) == 1
+    assert coordinator.snapshots["away"] == {"L1": {"is_on": False}}
+
+
+def test_empty_snapshot_keeps_existing_one():
+    """An entry recording no devices keeps its snapshot of the same name."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(device_id="L1", is_on=True)
+    coordinator.device_registry["L1"] = device
+    coordinator.platform_devices["light"]["L1"] = device
+    assert coordinator.async_create_snapshot("away") == 1
+
+    assert coordinator.async_create_snapshot("away", ["other_entry_device"]) == 0
+    assert coordinator.snapshots["away"] == {"L1": {"is_on": True}}
+    assert coordinator.async_create_snapshot("empty", []) == 0
+    assert "empty" not in coordinator.snapshots
+
+
+# ---------------------------------------------------------------------------
+# Redundant command skipping
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_redundant_commands_are_skipped_while_state_is_fresh():
+    """A command matching fresh cached state is not sent; a stale one is."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.skip_redundant = True
+    device = _make_device(is_on=True)
+    device.current_level = None
+    coordinator._handle_device_update(device)
+
+    assert await coordinator.async_send_command(device, "turn_on") is False
+    assert await coordinator.async_send_command(device, "turn_off") is True
+    device.turn_on.assert_not_awaited()
+    device.turn_off.assert_awaited_once()
+    assert coordinator.counters["commands_skipped"] == 1
+
+    coordinator._state_seen[device.id] -= coordinator.state_max_age + 1
+    assert await coordinator.async_send_command(device, "turn_on") is True
+    device.turn_on.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_cached_state_is_not_fresh_until_a_live_push():
+    """State restored from the topology cache never makes a command redundant."""
+    from homismart_client.enums import ReceivePrefix
+
+    coordinator, _, _ = _make_coordinator()
+    coordinator.skip_redundant = True
+    session = _attach_real_session(coordinator)
+    coordinator._store.data = {"devices": [dict(d) for d in TOPOLOGY]}
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        assert await coordinator.async_restore_topology() is True
+    light = coordinator.device_registry["L1"]
+    light.turn_on = AsyncMock()
+    assert light.is_on is True
+
+    assert await coordinator.async_send_command(light, "turn_on") is True
+    light.turn_on.assert_awaited_once()
+
+    session.dispatch_message(
+        ReceivePrefix.DEVICE_UPDATE_PUSH.value, {"id": "L1", "power": True}
+    )
+    await asyncio.sleep(0)
+    assert await coordinator.async_send_command(light, "turn_on") is False
+    assert coordinator.counters["commands_skipped"] == 1
+    coordinator._new_device_handle.cancel()
+
+
+@pytest.mark.asyncio
+async def test_redundant_cover_position_is_skipped_only_when_enabled():
+    """set_level to the current level is sent unless the option is on."""
+    coordinator, _, _ = _make_coordinator()
+    cover = _make_device(device_id="C1")
+    cover.current_level = 40
+    cover.set_level = AsyncMock()
+    coordinator._handle_device_update(cover)
+
+    assert await coordinator.async_send_command(cover, "set_level", 40) is True
+    coordinator.skip_redundant = True
+    assert await coordinator.async_send_command(cover, "set_level", 40) is False
+    assert await coordinator.async_send_command(cover, "set_level", 60) is True
+    assert cover.set_level.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_command_is_not_skipped_while_another_is_in_flight():
+    """Moving back while a move is being sent is not a no-op."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.skip_redundant = True
+    cover = _make_device(device_id="C1")
+    cover.current_level = 0
+    release = asyncio.Event()
+    sent = []
+
+    async def _set_level(level):
+        sent.append((level,))
+        await release.wait()
+
+    cover.set_level = _set_level
+    coordinator._handle_device_update(cover)
+
+    first = asyncio.ensure_future(coordinator.async_send_command(cover, "set_level", 30))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(coordinator.async_send_command(cover, "set_level", 0))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first is True
+    assert await second is True
+    assert sent == [(30,), (0,)]
+    assert not coordinator._commands_in_flight
+
+
+@pytest.mark.asyncio
+async def test_command_is_not_skipped_while_awaiting_confirmation():
+    """Turning back on before the off is confirmed still sends the on."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.skip_redundant = True
+    device = _make_device(is_on=True)
+    device.current_level = None
+    coordinator._handle_device_update(device)
+
+    assert await coordinator.async_send_command(device, "turn_off") is True
+    assert device.id in coordinator._awaiting_confirm
+    assert await coordinator.async_send_command(device, "turn_on") is True
+    device.turn_on.assert_awaited_once()
+    assert coordinator.counters["commands_skipped"] == 0
+
+
+# ---------------------------------------------------------------------------
+# Direct per-device subscriptions
+# ---------------------------------------------------------------------------
+
+def test_device_subscription_and_unsubscribe():
+    """Only a device's own subscribers are called, until they unsubscribe."""
+    coordinator, _, _ = _make_coordinator()
+    first, second, other = MagicMock(), MagicMock(side_effect=ValueError), MagicMock()
+    unsub_first = coordinator.async_subscribe_device("dev1", first)
+    coordinator.async_subscribe_device("dev1", second)
+    coordinator.async_subscribe_device("dev2", other)
+
+    coordinator._dirty_devices = {"dev1", "unknown"}
+    coordinator._async_flush_updates()
+    # A failing subscriber does not stop the others.
+    assert (first.call_count, second.call_count, other.call_count) == (1, 1, 0)
+
+    unsub_first()
+    coordinator._dirty_devices = {"dev1"}
+    coordinator._async_flush_updates()
+    assert (first.call_count, second.call_count) == (1, 2)
+
+
+# ---------------------------------------------------------------------------
+# Superseding ingest queue
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_ingest_queue_supersedes_and_tracks_high_water():
+    """Repeated pushes for a device are processed once, after yielding."""
+    coordinator, _, _ = _make_coordinator()
+    devices = [_make_device(device_id=f"dev{i}") for i in range(5)]
+
+    for _ in range(4):
+        for device in devices:
+            coordinator._async_enqueue_update(device)
+
+    assert coordinator.device_registry == {}
+    assert coordinator.ingest_high_water == 5
+    assert coordinator.counters["ingest_superseded"] == 15
+
+    await asyncio.sleep(0)
+    assert set(coordinator.device_registry) == {d.id for d in devices}
+    assert coordinator.counters["device_updated"] == 5
+
+
+@pytest.mark.asyncio
+async def test_ingest_queue_drains_in_slices_and_overflows():
+    """A dump is drained over several loop iterations; overflow runs inline."""
+    coordinator, _, _ = _make_coordinator()
+    devices = [_make_device(device_id=f"dev{i}") for i in range(4)]
+
+    with patch("custom_components.homismart.coordinator.INGEST_SLICE", 0), patch(
+        "custom_components.homismart.coordinator.INGEST_MAX_PENDING", 3
+    ):
+        for device in devices:
+            coordinator._async_enqueue_update(device)
+        # The fourth push made room by processing the oldest one.
+        assert list(coordinator.device_registry) == ["dev0"]
+        assert coordinator.counters["ingest_overflow"] == 1
+
+        await asyncio.sleep(0)
+        assert len(coordinator.device_registry) == 2
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    assert len(coordinator.device_registry) == 4
+    assert coordinator.counters["ingest_slices"] == 3
+
+
+# ---------------------------------------------------------------------------
+# Incremental resync after reconnect
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_reconnect_resync_only_pushes_changed_devices():
+    """The list resent after a reconnect only reprocesses changed devices.
+
+    Every entity is notified once, so it can write its availability.
+    """
+    from homismart_client.enums import ReceivePrefix
+
+    coordinator, _, _ = _make_coordinator()
+    session = _attach_real_session(coordinator)
+    coordinator._async_register_listeners()
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        session._emit_event("session_authenticated", "user")
+        session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, TOPOLOGY)
+        await asyncio.sleep(0)
+        notified = _subscribe_all(coordinator, ["L1", "S1", "C1"])
+
+        session._emit_event("session_authenticated", "user")
+        live = [dict(d) for d in TOPOLOGY]
+        live[1]["power"] = False
+        session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, live)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    assert sorted(notified) == ["C1", "L1", "S1"]
+    assert coordinator.counters["reconnects"] == 1
+    assert coordinator.counters["resync_unchanged"] == 2
+    [resync] = coordinator.resync_history
+    assert (resync["changed"], resync["unchanged"]) == (1, 2)
+    assert resync["duration_ms"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_device_recreated_during_resync_finishes_it():
+    """A re-created device is ticked off, and its old queued push dropped."""
+    coordinator, _, _ = _make_coordinator()
+    old = _make_device(device_id="dev1")
+    other = _make_device(device_id="dev2")
+    coordinator._handle_new_device(old)
+    coordinator._handle_new_device(other)
+
+    coordinator._handle_session_authenticated("user")
+    coordinator._async_enqueue_update(old)
+    new = _make_device(device_id="dev1", device_type_code=1)
+    coordinator._handle_new_device(new)
+    coordinator._async_enqueue_update(other)
+    await asyncio.sleep(0)
+
+    assert coordinator.device_registry["dev1"] is new
+    [resync] = coordinator.resync_history
+    assert (resync["changed"], resync["unchanged"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_identical_push_skipped_only_during_resync():
+    """Identical pushes are delivered, except for the list resent after login."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device()
+    coordinator._handle_new_device(device)
+    notified = _subscribe_all(coordinator, ["dev1"])
+
+    coordinator._handle_device_update(device)
+    await asyncio.sleep(0)
+    assert notified == ["dev1"]
+
+    coordinator._handle_session_authenticated("user")
+    with patch.object(coordinator, "_async_index_device") as index:
+        coordinator._handle_device_update(device)
+    await asyncio.sleep(0)
+    index.assert_not_called()
+    # Still notified, so its entities can write their availability.
+    assert notified == ["dev1", "dev1"]
+    assert coordinator.resync_history[-1]["unchanged"] == 1
+
+
+@pytest.mark.asyncio
+async def test_restored_entity_becomes_available_after_login(routed_dispatcher):
+    """An unchanged device still writes its entity once the login succeeds."""
+    from homismart_client.enums import ReceivePrefix
+
+    coordinator, hass, entry = _make_coordinator()
+    session = _attach_real_session(coordinator)
+    coordinator._store.data = {"devices": [dict(d) for d in TOPOLOGY]}
+    coordinator.client.is_connected = False
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        assert await coordinator.async_restore_topology() is True
+    coordinator._new_device_handle.cancel()
+    adders = await _setup_platforms(coordinator, hass, entry)
+    [light] = adders["light"].call_args.args[0]
+    light.async_write_ha_state = MagicMock()
+    coordinator.async_subscribe_device("L1", light._update_callback)
+    light._last_written_state = light._projected_state()
+    assert light.available is False
+
+    coordinator.client.is_connected = True
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        session._emit_event("session_authenticated", "user")
+        session.dispatch_message(
+            ReceivePrefix.DEVICE_LIST.value, [dict(d) for d in TOPOLOGY]
+        )
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert coordinator.resync_history[-1]["unchanged"] == 3
+    light.async_write_ha_state.assert_called_once()
+    assert light.available is True
+
+
+# ---------------------------------------------------------------------------
+# Device registry writes
+# ---------------------------------------------------------------------------
+
+def test_hub_pings_do_not_touch_device_registry():
+    """Only a new or renamed hub is written to HA's device registry."""
+    coordinator, _, _ = _make_coordinator()
+    hub = _make_hub("00HUB1")
+    mock_ha_dev_reg = MagicMock()
+
+    with patch(
+        "custom_components.homismart.coordinator.dr.async_get",
+        return_value=mock_ha_dev_reg,
+    ):
+        for online in (True, False, True):
+            hub.is_online = online
+            coordinator._handle_hub_update(hub)
+        assert mock_ha_dev_reg.async_get_or_create.call_count == 1
+
+        hub.name = "Upstairs"
+        coordinator._handle_hub_update(hub)
+
+    assert mock_ha_dev_reg.async_get_or_create.call_count == 2
+    assert mock_ha_dev_reg.async_get_or_create.call_args.kwargs["name"] == "Upstairs"
+
+
+def test_child_rename_and_firmware_update_device_registry():
+    """A renamed or upgraded device is updated in HA's device registry."""
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(name="Hall", version=1)
+    coordinator._handle_new_device(device)
+    mock_ha_dev_reg = MagicMock()
+    mock_ha_dev_reg.async_get_device.return_value.id = "ha-device-1"
+
+    with patch(
+        "custom_components.homismart.coordinator.dr.async_get",
+        return_value=mock_ha_dev_reg,
+    ):
+        device.is_on = False
+        coordinator._handle_device_update(device)
+        mock_ha_dev_reg.async_update_device.assert_not_called()
+
+        device.name = "Landing"
+        device.version = 2
+        coordinator._handle_device_update(device)
+
+    mock_ha_dev_reg.async_update_device.assert_called_once_with(
+        "ha-device-1", name="Landing", sw_version="2"
+    )
+
+
+def test_device_info_cached_until_metadata_changes():
+    """device_info is built once and rebuilt after a metadata change."""
+    from homismart_client.enums import DeviceType
+
+    coordinator, _, _ = _make_coordinator()
+    device = _make_device(device_type_enum=DeviceType.SWITCH, version=1)
+    coordinator._handle_new_device(device)
+    light = HomiSmartLight(coordinator, device)
+
+    with patch.object(
+        HomiSmartLight, "_build_device_info", wraps=light._build_device_info
+    ) as build:
+        info = light.device_info
+        device.is_on = False
+        coordinator._handle_device_update(device)
+        assert light.device_info is info
+        assert build.call_count == 1
+
+        device.version = 2
+        with patch("custom_components.homismart.coordinator.dr.async_get"):
+            coordinator._handle_device_update(device)
+        refreshed = light.device_info
+        assert light.device_info is refreshed
+        assert build.call_count == 2
+
+    assert refreshed is not info
+    assert refreshed.sw_version == "2"
+    assert refreshed.model == "Switch (2)"
+
+
+# ---------------------------------------------------------------------------
+# Event log
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_event_log_keeps_recent_raw_events():
+    """The ring buffer keeps the newest events and dumps them per device."""
+    from custom_components.homismart.services import (
+        SERVICE_DUMP_EVENTS,
+        async_setup_services,
+    )
+
+    coordinator, hass, _ = _make_coordinator()
+    coordinator.event_log = deque(maxlen=3)
+    device = _make_device()
+    other = _make_device(device_id="dev2")
+    coordinator._handle_new_device(device)
+    for i in range(3):
+        device.raw = {"id": "dev1", "power": bool(i % 2)}
+        coordinator._async_enqueue_update(device)
+    coordinator._async_enqueue_update(other)
+
+    events = coordinator.async_dump_events()
+    assert [e["event"] for e in events] == ["device_updated"] * 3
+    assert [e["payload"].get("power") for e in events] == [True, False, None]
+
+    hass.data = {DOMAIN: {"entry": coordinator}}
+    hass.services.has_service.return_value = False
+    async_setup_services(hass)
+    handler = _registered_service(hass, SERVICE_DUMP_EVENTS)
+    call = MagicMock()
+    call.data = {"device_id": ["dev2"]}
+    response = await handler(call)
+    assert [e["device_id"] for e in response["events"]] == ["dev2"]
+
+
+def test_event_log_disabled_with_zero_size():
+    """A size of 0 records nothing."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.event_log = deque(maxlen=0)
+    coordinator._handle_new_device(_make_device())
+    assert coordinator.async_dump_events() == []
+
+
+# ---------------------------------------------------------------------------
+# Diagnostics
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_diagnostics_report_counters_and_redact_credentials():
+    """Diagnostics summarize the coordinator's counters without credentials."""
+    from homismart_client.enums import DeviceType
+
+    from custom_components.homismart.diagnostics import (
+        async_get_config_entry_diagnostics,
+    )
+
+    coordinator, hass, entry = _make_coordinator()
+    hass.data = {DOMAIN: {entry.entry_id: coordinator}}
+    session = MagicMock()
+    coordinator.client.session = session
+    coordinator._async_register_listeners()
+    listeners = {
+        c.args[0]: c.args[1] for c in session.register_event_listener.call_args_list
+    }
+    light = _make_device(device_id="L1", device_type_enum=DeviceType.SWITCH)
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        listeners["new_hub_added"](_make_hub("00HUB1"))
+    listeners["new_device_added"](light)
+    listeners["device_updated"](light)
+    await coordinator.async_send_command(light, "turn_off")
+    coordinator.counters["state_writes_suppressed"] += 2
+
+    diag = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert diag["entry"]["data"] == {
+        "username": "**REDACTED**",
+        "password": "**REDACTED**",
+    }
+    assert diag["devices"] == {
+        "hubs": 1, "light": 1, "cover": 0, "switch": 0, "unsupported": 0
+    }
+    assert diag["events"]["counts"] == {
+        "new_hub_added": 1, "new_device_added": 1, "device_updated": 1
+    }
+    assert diag["state_writes"]["suppressed"] == 2
+    assert diag["commands"]["latency"]["count"] == 1
+    assert "p95_ms" in diag["commands"]["latency"]
+    assert diag["callbacks"]["device_updated"]["calls"] == 1
+    assert [e["device_id"] for e in diag["recent_events"]] == ["00HUB1", "L1", "L1"]
+
+
+def test_latency_percentiles():
+    """Percentiles use the nearest rank of the recent samples."""
+    from custom_components.homismart.stats import LatencySamples
+
+    samples = LatencySamples(size=100)
+    assert samples.summary() == {"count": 0}
+    for ms in range(1, 201):
+        samples.add(ms / 1000)
+
+    # Only the latest 100 samples (101..200 ms) are kept; max is all-time.
+    assert samples.percentile(50) == 0.15
+    assert samples.summary() == {
+        "count": 200, "p50_ms": 150.0, "p95_ms": 195.0, "p99_ms": 199.0,
+        "max_ms": 200.0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Command confirmation latency
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_command_confirmation_latency_per_hub_and_type():
+    """A command is timed until the push showing its target state."""
+    from homismart_client.enums import DeviceType
+
+    from custom_components.homismart.sensor import (
+        HomiSmartLatencySensor,
+        HomiSmartTimeoutSensor,
+    )
+
+    coordinator, _, _ = _make_coordinator()
+    cover = _make_device(device_id="C1", device_type_enum=DeviceType.CURTAIN)
+    cover.current_level = 100
+    cover.set_level = AsyncMock()
+    sensor = HomiSmartLatencySensor(coordinator, "hub1", "p95")
+    assert sensor.native_value is None
+
+    await coordinator.async_send_command(cover, "set_level", 40)
+    # Levels passed on the way do not confirm the command.
+    cover.current_level = 70
+    coordinator._async_enqueue_update(cover)
+    assert "C1" in coordinator._awaiting_confirm
+    cover.current_level = 40
+    coordinator._async_enqueue_update(cover)
+
+    assert coordinator._awaiting_confirm == {}
+    assert coordinator.confirm_latency_by_hub["hub1"].count == 1
+    assert coordinator.confirm_latency_by_type["CURTAIN"].count == 1
+    assert sensor.native_value is not None
+    assert HomiSmartTimeoutSensor(coordinator, "hub1").native_value == 0
+    coordinator._confirm_sweep.cancel()
+
+
+@pytest.mark.asyncio
+async def test_unconfirmed_commands_time_out():
+    """Commands without a confirming push are counted as timeouts per hub."""
+    from custom_components.homismart.sensor import HomiSmartTimeoutSensor
+
+    coordinator, _, _ = _make_coordinator()
+    light = _make_device(device_id="L1", is_on=False)
+    already_on = _make_device(device_id="L2", is_on=True)
+
+    await coordinator.async_send_command(light, "turn_on")
+    # Nothing is awaited for a device already in the target state.
+    await coordinator.async_send_command(already_on, "turn_on")
+    assert list(coordinator._awaiting_confirm) == ["L1"]
+
+    with patch(
+        "custom_components.homismart.coordinator.time.monotonic",
+        return_value=time.monotonic() + 61,
+    ):
+        coordinator._confirm_sweep.cancel()
+        coordinator._async_expire_confirmations()
+
+    assert coordinator._awaiting_confirm == {}
+    assert coordinator._confirm_sweep is None
+    assert coordinator.counters["confirm_timeouts"] == 1
+    assert HomiSmartTimeoutSensor(coordinator, "hub1").native_value == 1
+
+
+@pytest.mark.asyncio
+async def test_sensor_platform_follows_latency_option():
+    """Latency sensors are only set up when the option is on, per hub."""
+    from custom_components.homismart import sensor
+
+    coordinator, hass, entry = _make_coordinator()
+    assert "sensor" not in coordinator.platforms
+    coordinator.latency_sensors = True
+    assert coordinator.platforms == ["light", "cover", "switch", "sensor"]
+
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        coordinator._handle_hub_update(_make_hub("00HUB1"))
+    hass.data = {DOMAIN: {entry.entry_id: coordinator}}
+    add_entities = MagicMock()
+    await sensor.async_setup_entry(hass, entry, add_entities)
+
+    [entities] = add_entities.call_args.args
+    assert sorted(e._attr_unique_id for e in entities) == [
+        "00HUB1_command_latency_max",
+        "00HUB1_command_latency_p50",
+        "00HUB1_command_latency_p95",
+        "00HUB1_command_timeouts",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_new_hub_signal_scoped_to_entry():
+    """A new hub only reaches the sensor platform of its own entry."""
+    from custom_components.homismart import sensor
+
+    dispatcher_mock.reset_mock()
+    coordinator, hass, entry = _make_coordinator()
+    with patch("custom_components.homismart.coordinator.dr.async_get"):
+        coordinator._handle_hub_update(_make_hub("00HUB1"))
+    dispatcher_mock.async_dispatcher_send.assert_called_once_with(
+        hass, "homismart_new_hub_test_entry_id", ["00HUB1"]
+    )
+
+    other = MagicMock(entry_id="other_entry")
+    hass.data = {DOMAIN: {"other_entry": coordinator}}
+    await sensor.async_setup_entry(hass, other, MagicMock())
+    assert dispatcher_mock.async_dispatcher_connect.call_args.args[1] == (
+        "homismart_new_hub_other_entry"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Callback budget watchdog
+# ---------------------------------------------------------------------------
+
+def test_slow_callbacks_logged_once_per_interval(caplog):
+    """Calls over the budget are counted; the warning is rate limited."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.callback_budget = 0.01
+
+    coordinator.async_record_callback_time("flush_updates", 0.001, 3)
+    with caplog.at_level("WARNING"):
+        coordinator.async_record_callback_time("flush_updates", 0.05, 3)
+        coordinator.async_record_callback_time("flush_updates", 0.02, 3)
+
+    assert coordinator.callback_calls["flush_updates"] == 3
+    assert coordinator.callback_over_budget["flush_updates"] == 2
+    assert coordinator.callback_max["flush_updates"] == 0.05
+    slow = [r for r in caplog.records if "over the 10.0 ms budget" in r.message]
+    assert len(slow) == 1
+    assert "payload of 3 items" in slow[0].message
+
+
+def test_slow_callback_warnings_report_the_items_handled(caplog):
+    """Flushes, drains and hub updates report dirty, queued and child counts."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.callback_budget = -1
+    session = MagicMock()
+    coordinator.client.session = session
+    coordinator._async_register_listeners()
+    listeners = {
+        c.args[0]: c.args[1] for c in session.register_event_listener.call_args_list
+    }
+    coordinator.hub_children["00HUB1"] = {"L1", "S1"}
+    for device_id in ("L1", "S1", "C1"):
+        coordinator._async_mark_dirty(device_id)
+        coordinator._ingest_pending[device_id] = _make_device(device_id=device_id)
+    coordinator._flush_handle.cancel()
+
+    with caplog.at_level("WARNING"), patch(
+        "custom_components.homismart.coordinator.dr.async_get"
+    ):
+        coordinator._timed_flush_updates()
+        coordinator._timed_drain_updates()
+        listeners["hub_updated"](_make_hub("00HUB1"))
+
+    payloads = {
+        r.args[0]: r.args[3] for r in caplog.records if "budget" in r.message
+    }
+    assert payloads == {"flush_updates": 3, "drain_updates": 3, "hub_updated": 2}
+
+
+def test_timed_handlers_and_state_writes_are_measured():
+    """Session handlers and entity state writes report their time."""
+    coordinator, _, _ = _make_coordinator()
+    coordinator.callback_budget = 0
+    handler = coordinator._timed("new_device_added", MagicMock())
+    handler([_make_device(), _make_device(device_id="dev2")])
+    assert coordinator.callback_over_budget["new_device_added"] == 1
+
+    device = _make_device(is_on=True)
+    light = HomiSmartLight(coordinator, device)
+    light.async_write_ha_state = MagicMock()
+    device.is_on = False
+    light._update_callback()
+    assert coordinator.callback_calls["state_write"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Local stand-in server: connect() end to end, offline
+# ---------------------------------------------------------------------------
+
+def _make_live_coordinator(server):
+    """Create a coordinator whose real client talks to the stand-in server."""
+    hass = MagicMock()
+    hass.loop = asyncio.get_event_loop()
+    entry = MagicMock()
+    entry.data = {"username": "test@test.com", "password": "pass"}
+    entry.options = {}
+    entry.entry_id = "test_entry_id"
+    coordinator = HomiSmartCoordinator(hass, entry)
+    coordinator.client._ws_url = server.url
+    return coordinator
+
+
+async def _wait_for(predicate, timeout=5.0):
+    """Poll *predicate* on the loop until it holds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_connect_against_stand_in_server():
+    """connect() logs in, and the device list reaches the coordinator."""
+    from homismart_server import HomismartServer, make_fleet
+
+    async with HomismartServer(make_fleet(500)) as server:
+        coordinator = _make_live_coordinator(server)
+        try:
+            await coordinator.connect()
+            await _wait_for(lambda: len(coordinator.device_registry) == len(server.devices))
+            assert server.logins == 1
+            assert len(coordinator.hub_ids) == 10
+            assert coordinator.client.is_connected
+        finally:
+            await coordinator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_stand_in_server_rejects_bad_login():
+    """A rejected login leaves the client logged out until its timeout."""
+    from homismart_server import HomismartServer
+
+    async with HomismartServer(password="other") as server:
+        coordinator = _make_live_coordinator(server)
+        # The client's own timeout, unlike cancelling connect() from the
+        # outside, also cancels its wait for the login.
+        with pytest.raises(asyncio.TimeoutError):
+            await coordinator.client.connect(timeout=0.5)
+        assert server.rejected_logins == 1
+        assert not coordinator.client.is_logged_in
+        await coordinator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_command_confirmed_with_injected_latency():
+    """Commands are acked by a push after the server's injected latency."""
+    from homismart_server import HomismartServer, make_fleet
+
+    async with HomismartServer(make_fleet(3), latency=0.05) as server:
+        coordinator = _make_live_coordinator(server)
+        try:
+            await coordinator.connect()
+            await _wait_for(lambda: len(coordinator.device_registry) == len(server.devices))
+            device = coordinator.device_registry["D000001"]
+            assert await coordinator.async_send_command(device, "turn_on")
+            await _wait_for(lambda: device.is_on)
+            assert server.devices["D000001"]["power"] is True
+            samples = coordinator.confirm_latency_by_hub["00HUB00000"]
+            assert samples.count == 1
+            assert samples.percentile(50) >= 0.05
+        finally:
+            await coordinator.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_push_load_all_events_received():
+    """Every push sent at a steady rate arrives as a device_updated event."""
+    from homismart_server import HomismartServer, make_fleet
+
+    async with HomismartServer(make_fleet(1000)) as server:
+        coordinator = _make_live_coordinator(server)
+        try:
+            await coordinator.connect()
+            await _wait_for(lambda: len(coordinator.device_registry) == len(server.devices))
+            before = coordinator.event_counts["device_updated"]
+            sent = await server.run_pushes(rate=5000, duration=0.2)
+            assert sent >= 500
+            await _wait_for(
+                lambda: coordinator.event_counts["device_updated"] - before == sent
+            )
+        finally:
+            await coordinator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("abort", [False, True])
+async def test_reconnect_storm_resyncs_each_time(abort):
+    """Repeated forced disconnects end in a clean login and resync each time."""
+    from homismart_server import HomismartServer, make_fleet
+
+    async with HomismartServer(make_fleet(200)) as server:
+        coordinator = _make_live_coordinator(server)
+        try:
+            with patch("homismart_client.client.RECONNECT_BASE_DELAY", 0):
+                await coordinator.connect()
+                await _wait_for(lambda: len(coordinator.device_registry) == len(server.devices))
+                for drop in range(1, 4):
+                    await server.drop_connections(abort=abort)
+                    await _wait_for(lambda: len(coordinator.resync_history) == drop)
+            assert server.logins == 4
+            assert coordinator.counters["reconnects"] == 3
+            assert coordinator.resync_history[-1]["unchanged"] == 200
+        finally:
+            await coordinator.disconnect()
+
+
+# ---------------------------------------------------------------------------
+# Record and replay of raw session events
+# ---------------------------------------------------------------------------
+
+def _make_capturing_coordinator(tmp_path):
+    """Create a coordinator with a real session that can write captures."""
+    coordinator, hass, entry = _make_coordinator()
+    loop = asyncio.get_event_loop()
+    hass.config.path = lambda *parts: str(tmp_path.joinpath(*parts))
+    hass.async_create_task = loop.create_task
+    hass.async_add_executor_job = lambda func, *args: loop.run_in_executor(
+        None, func, *args
+    )
+    session = _attach_real_session(coordinator)
+    coordinator._async_register_listeners()
+    return coordinator, hass, session
+
+
+@pytest.mark.asyncio
+async def test_capture_round_trips_through_replay(tmp_path):
+    """A capture replayed into a fresh coordinator reproduces its events."""
+    from homismart_client.enums import ReceivePrefix
+    from custom_components.homismart.capture import async_replay, read_capture
+
+    coordinator, _, session = _make_capturing_coordinator(tmp_path)
+    path = str(tmp_path / "capture.jsonl")
+    await coordinator.async_start_capture(path, 60)
+    session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, TOPOLOGY)
+    session.dispatch_message(
+        ReceivePrefix.DEVICE_UPDATE_PUSH.value, {"id": "S1", "power": True}
+    )
+    assert await coordinator.async_stop_capture() == {"path": path, "events": 5}
+    assert coordinator.capture is None
+
+    events = read_capture(path)
+    assert [e.event for e in events] == [
+        "new_hub_added",
+        "new_device_added",
+        "new_device_added",
+        "new_device_added",
+        "device_updated",
+    ]
+    # The update was captured as pushed, not as the device looks later.
+    assert events[1].raw["id"] == "L1"
+    assert events[4].raw["power"] is True
+
+    replayed, _, _ = _make_capturing_coordinator(tmp_path)
+    assert await async_replay(replayed, events, speed=None) == 5
+    assert replayed.event_counts == coordinator.event_counts
+    assert replayed.device_registry["S1"].is_on is True
+    await coordinator.disconnect()
+    await replayed.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_timing_scaled_by_speed():
+    """Replay waits out the captured gaps, divided by the speed."""
+    from custom_components.homismart.capture import CapturedEvent, async_replay
+
+    coordinator, _, _ = _make_coordinator()
+    session = _attach_real_session(coordinator)
+    events = [
+        CapturedEvent(5.0, "new_device_added", dict(TOPOLOGY[2])),
+        CapturedEvent(5.5, "device_updated", {"id": "S1", "power": True}),
+    ]
+    start = time.monotonic()
+    assert await async_replay(coordinator, events, speed=10) == 2
+    assert 0.05 <= time.monotonic() - start < 0.5
+    assert session.get_device_by_id("S1").is_on is True
+
+
+@pytest.mark.asyncio
+async def test_capture_stops_after_duration(tmp_path):
+    """A capture stops listening by itself once its duration is up."""
+    from homismart_client.enums import ReceivePrefix
+    from custom_components.homismart.capture import read_capture
+
+    coordinator, _, session = _make_capturing_coordinator(tmp_path)
+    path = str(tmp_path / "capture.jsonl")
+    await coordinator.async_start_capture(path, 0.05)
+    session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, TOPOLOGY[:2])
+    await asyncio.sleep(0.1)
+    assert not coordinator.capture.active
+    session.dispatch_message(
+        ReceivePrefix.DEVICE_UPDATE_PUSH.value, {"id": "L1", "power": False}
+    )
+    assert (await coordinator.async_stop_capture())["events"] == 2
+    assert len(read_capture(path)) == 2
+
+
+def test_read_capture_rejects_other_files(tmp_path):
+    """Files without the capture header are refused."""
+    from custom_components.homismart.capture import read_capture
+
+    path = tmp_path / "other.jsonl"
+    path.write_text('{"id": "L1"}\n')
+    with pytest.raises(ValueError):
+        read_capture(str(path))
+
+
+@pytest.mark.asyncio
+async def test_capture_services_start_and_stop(tmp_path):
+    """The services capture every entry to the config dir and report back."""
+    from homismart_client.enums import ReceivePrefix
+    from custom_components.homismart.services import async_setup_services
+
+    coordinator, hass, session = _make_capturing_coordinator(tmp_path)
+    hass.data = {DOMAIN: {"entry1": coordinator}}
+    hass.services.has_service.return_value = False
+    async_setup_services(hass)
+
+    started = await _registered_service(hass, "start_capture")(
+        MagicMock(data={"duration": 60})
+    )
+    (path,) = started["paths"]
+    assert path.startswith(str(tmp_path / "homismart_capture_entry1_"))
+    session.dispatch_message(ReceivePrefix.DEVICE_LIST.value, TOPOLOGY[:1])
+    stopped = await _registered_service(hass, "stop_capture")(MagicMock(data={}))
+    assert stopped == {"captures": [{"path": path, "events": 1}]}